@@ -0,0 +1,135 @@
+import numpy as np
+from vectormath import Vector3
+
+from .particle import Particle
+from .deuteron import Deuteron
+from .triton import Triton
+from .helion import Helion
+from .neutron import Neutron
+
+# species codes used in ParticleStore.species
+DEUTERON = 0
+TRITON = 1
+HELION = 2
+NEUTRON = 3
+
+species_classes = (Deuteron, Triton, Helion, Neutron)
+species_mass = np.array([cls().mass_kg for cls in species_classes])  # [kg]
+species_charge = np.array([cls().charge for cls in species_classes], dtype=float)  # [C]
+species_colors = tuple(cls().get_color() for cls in species_classes)
+
+
+def species_of(particle):
+    for code, cls in enumerate(species_classes):
+        if isinstance(particle, cls):
+            return code
+    raise TypeError("unknown particle type: " + type(particle).__name__)
+
+
+# particle state kept in contiguous arrays, one row per particle
+class ParticleStore:
+    def __init__(self):
+        self.position = np.zeros((0, 3))  # [m]
+        self.velocity = np.zeros((0, 3))  # [m/s]
+        self.species = np.zeros(0, dtype=np.int8)
+        self.mass = np.zeros(0)  # [kg]
+        self.charge = np.zeros(0)  # [C]
+
+    def __len__(self):
+        return len(self.species)
+
+    @classmethod
+    def from_particles(cls, particles):
+        store = cls()
+        store.add_many([species_of(p) for p in particles],
+                       [p.position for p in particles],
+                       [p.velocity for p in particles])
+        return store
+
+    def add(self, species, x=0, y=0, z=0, vx=0, vy=0, vz=0):
+        self.add_many([species], [(x, y, z)], [(vx, vy, vz)])
+        return len(self) - 1
+
+    def add_many(self, species, positions, velocities):
+        species = np.asarray(species, dtype=np.int8).reshape(-1)
+        self.position = np.concatenate([self.position, np.asarray(positions, dtype=float).reshape(-1, 3)])
+        self.velocity = np.concatenate([self.velocity, np.asarray(velocities, dtype=float).reshape(-1, 3)])
+        self.species = np.concatenate([self.species, species])
+        self.mass = np.concatenate([self.mass, species_mass[species]])
+        self.charge = np.concatenate([self.charge, species_charge[species]])
+
+    # change particle type (e.g. after fusion), index may be an array. mass and charge are replaced by
+    # new arrays rather than written in place, so solvers that keep copies can tell that they changed
+    def set_species(self, index, species):
+        self.species[index] = species
+        self.mass = self.mass.copy()
+        self.mass[index] = species_mass[species]
+        self.charge = self.charge.copy()
+        self.charge[index] = species_charge[species]
+
+    def count(self, species):
+        return int(np.count_nonzero(self.species == species))
+
+    def get_speeds(self):
+        return np.sqrt(np.einsum('ij,ij->i', self.velocity, self.velocity))
+
+    def get_kinetic_energies(self):
+        return self.mass * np.einsum('ij,ij->i', self.velocity, self.velocity) / 2
+
+    def view(self, index):
+        return ParticleView(self, index)
+
+    def views(self):
+        return [ParticleView(self, i) for i in range(len(self))]
+
+    # independent Particle objects (copies), for code that needs the full class attributes
+    def to_particles(self):
+        particles = list()
+        for i in range(len(self)):
+            x, y, z = self.position[i]
+            vx, vy, vz = self.velocity[i]
+            particles.append(species_classes[self.species[i]](x, y, z, vx, vy, vz))
+        return particles
+
+
+# Particle interface on top of one row of a ParticleStore, changes are written back to the store
+class ParticleView(Particle):
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self.temperature = 298.15  # [K]
+
+    @property
+    def position(self):
+        return self.store.position[self.index].view(Vector3)
+
+    @position.setter
+    def position(self, value):
+        self.store.position[self.index] = value
+
+    @property
+    def velocity(self):
+        return self.store.velocity[self.index].view(Vector3)
+
+    @velocity.setter
+    def velocity(self, value):
+        self.store.velocity[self.index] = value
+
+    @property
+    def mass_kg(self):
+        return self.store.mass[self.index]
+
+    @property
+    def charge(self):
+        return self.store.charge[self.index]
+
+    @property
+    def species(self):
+        return int(self.store.species[self.index])
+
+    @property
+    def species_class(self):
+        return species_classes[self.species]
+
+    def get_color(self):
+        return species_colors[self.species]
@@ -0,0 +1,104 @@
+from math import sqrt
+
+import numpy as np
+
+import forces
+from forces import DirectForce
+from neighbors import direct_pairs_limit, get_direct_pairs
+
+# kernels behind Chamber: the exact pair force, the short-range pair search used for fusion and the wall
+# reflection. "python" loops over particles (reference), "numpy" works on whole arrays and "jit" runs
+# compiled multithreaded loops, falling back to "numpy" when numba is not installed
+
+
+# reference all-pairs force as plain loops, the same arithmetic as Particle.get_influence_from
+class PythonDirectForce:
+    def get_accelerations(self, position, charge, mass, bounds=None, targets=None):
+        if targets is None:
+            targets = range(len(position))
+        acc = np.zeros((len(targets), 3))
+        for k, i in enumerate(targets):
+            xi, yi, zi = position[i]
+            for j in range(len(position)):
+                dx, dy, dz = position[j, 0] - xi, position[j, 1] - yi, position[j, 2] - zi
+                dist = sqrt(dx * dx + dy * dy + dz * dz)
+                if dist > 0:
+                    a = forces.force_constant * charge[i] * charge[j] / dist ** 2 / mass[i]
+                    acc[k, 0] -= a * dx / dist
+                    acc[k, 1] -= a * dy / dist
+                    acc[k, 2] -= a * dz / dist
+        return acc
+
+
+class NumpyBackend:
+    name = "numpy"
+
+    def get_direct_force(self):
+        return DirectForce()
+
+    # (i, j) with i of species_a, j of species_b closer than max_dist, from the cell list or for a few
+    # particles from all pairs
+    def get_close_pairs(self, neighbors, position, species, species_a, species_b, max_dist):
+        if len(position) <= direct_pairs_limit:
+            return get_direct_pairs(position, species, species_a, species_b, max_dist)
+        neighbors.update(position, species)
+        return neighbors.get_pairs(position, species_a, species_b, max_dist)
+
+    # reflect particles outside [0, bounds] back in, damping the wall-normal velocity so that the wall
+    # takes wall_coeff of its kinetic energy; returns the total energy taken and the number of bounces
+    def reflect(self, position, velocity, mass, bounds, wall_coeff):
+        lost_energy = 0
+        bounces = 0
+        for axis, bound in enumerate(bounds):
+            low = position[:, axis] < 0
+            high = position[:, axis] > bound
+            hit = low | high
+            if np.any(hit):
+                bounces += int(np.count_nonzero(hit))
+                v = velocity[hit, axis]
+                lost_energy += np.sum(mass[hit] * v ** 2 / 2) * wall_coeff
+                velocity[hit, axis] = -v * sqrt(1 - wall_coeff)
+                position[low, axis] = 0
+                position[high, axis] = bound
+        return lost_energy, bounces
+
+
+class PythonBackend(NumpyBackend):
+    name = "python"
+
+    def get_direct_force(self):
+        return PythonDirectForce()
+
+    def get_close_pairs(self, neighbors, position, species, species_a, species_b, max_dist):
+        first, second = list(), list()
+        for i in np.flatnonzero(species == species_a):
+            for j in np.flatnonzero(species == species_b):
+                r = position[j] - position[i]
+                if i != j and r @ r < max_dist ** 2:
+                    first.append(i)
+                    second.append(j)
+        return np.array(first, dtype=np.int64), np.array(second, dtype=np.int64)
+
+    def reflect(self, position, velocity, mass, bounds, wall_coeff):
+        lost_energy = 0
+        bounces = 0
+        for i in range(len(position)):
+            p = position[i]
+            v = velocity[i]
+            for axis in range(3):
+                if p[axis] < 0 or p[axis] > bounds[axis]:
+                    bounces += 1
+                    lost_energy += (mass[i] * v[axis] ** 2 / 2) * wall_coeff
+                    v[axis] = -v[axis] * sqrt(1 - wall_coeff)
+                    p[axis] = 0 if p[axis] < 0 else bounds[axis]
+        return lost_energy, bounces
+
+
+def get_backend(name="numpy"):
+    if name == "jit":
+        try:
+            from jit_kernels import JitBackend
+        except ImportError:
+            return NumpyBackend()
+        return JitBackend()
+    return {"numpy": NumpyBackend, "python": PythonBackend}[name]()
@@ -0,0 +1,127 @@
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+import simulation
+from profiling import Profiler
+
+phases = ("forces", "fusion", "walls", "observables")  # timed by the chamber profiler, the rest is "other"
+scaling_pairs = (10, 30, 100, 300, 1000, 3000, 10000)  # scenario 6 scaling curve
+memory_steps = 3  # steps of the traced memory pass, memory use does not grow with the step count
+# end state of a case, with a fixed seed these must not change unless the physics did
+physics_fields = ("time", "reaction_count", "temperature", "sub_energy", "total_energy_released")
+
+
+# every built-in scenario at its default size, then scenario 6 at increasing pair counts
+def get_cases(max_pairs=10000):
+    cases = [{"name": "scenario-%d" % scenario, "scenario": scenario} for scenario in range(1, 6)]
+    for pairs in scaling_pairs:
+        if pairs <= max_pairs:
+            cases.append({"name": "scenario-6-%d" % pairs, "scenario": 6, "particle_pairs": pairs})
+    return cases
+
+
+# steps of a case, fewer for the large all-pairs runs so the whole suite stays in minutes
+def get_steps(case, steps):
+    return max(3, min(steps, steps * 300 // case.get("particle_pairs", 1)))
+
+
+# peak traced memory of setting up a case and a few steps, in a separate pass since tracing
+# slows down every allocation and would distort the timings
+def get_peak_memory(config, steps):
+    tracemalloc.start()
+    try:
+        chamber = simulation.build_chamber(config)
+        simulation.run_simulation(chamber, config["stop_time"], steps)
+        if hasattr(chamber.force, "close"):
+            chamber.force.close()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# run one case from base_config with a fixed seed, phase times and counters come from the chamber profiler
+def run_case(base_config, case, steps):
+    overrides = {key: value for key, value in case.items() if key != "name"}
+    config = simulation.make_config(base_config, overrides, {"seed": 0, "stop_time": float("inf")})
+    steps = get_steps(case, steps)
+    chamber = simulation.build_chamber(config)
+    chamber.profiler = profiler = Profiler()
+    start = time.perf_counter()
+    simulation.run_simulation(chamber, config["stop_time"], steps)
+    elapsed = time.perf_counter() - start
+    if hasattr(chamber.force, "close"):
+        chamber.force.close()
+    peak_memory = get_peak_memory(config, min(steps, memory_steps))
+    summary = profiler.close()
+    totals = {phase: summary["phases"].get(phase, 0.0) for phase in phases}
+    totals["other"] = max(elapsed - sum(totals.values()), 0.0)
+    return {
+        "name": case["name"],
+        "scenario": config["scenario"],
+        "particle_pairs": config["particle_pairs"],
+        "particles": len(chamber.store),
+        "steps": chamber.step_count,
+        "elapsed": elapsed,
+        "steps_per_second": chamber.step_count / elapsed if elapsed > 0 else float("inf"),
+        "phases": totals,
+        "counters": summary["counters"],
+        "peak_memory": peak_memory,
+        "force_evaluations": chamber.force_evaluations,
+        "time": chamber.Time,
+        "reaction_count": chamber.reaction_count,
+        "temperature": float(chamber.Temperature),
+        "sub_energy": float(chamber.sub_energy),
+        "total_energy_released": chamber.total_energy_released,
+    }
+
+
+def get_machine():
+    return {"platform": platform.platform(), "python": platform.python_version(), "numpy": np.__version__,
+            "cpu_count": os.cpu_count()}
+
+
+def run_benchmarks(base_config, steps=50, max_pairs=10000, callback=None):
+    results = {"machine": get_machine(), "config": base_config, "steps": steps, "cases": list()}
+    cases = get_cases(max_pairs)
+    run_case(base_config, cases[0], 1)  # untimed warm-up, so first-call costs do not land on the first case
+    for case in cases:
+        result = run_case(base_config, case, steps)
+        results["cases"].append(result)
+        if callback is not None:
+            callback(result)
+    return results
+
+
+def save_results(path, results):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# regressions against a baseline run: cases more than tolerance slower, and cases whose end
+# state differs although they ran the same number of steps (the physics changed)
+def compare_results(results, baseline, tolerance=0.2, rtol=1e-9):
+    problems = list()
+    baseline_cases = {case["name"]: case for case in baseline["cases"]}
+    for case in results["cases"]:
+        old = baseline_cases.get(case["name"])
+        if old is None:
+            continue
+        ratio = case["steps_per_second"] / old["steps_per_second"]
+        if ratio < 1 - tolerance:
+            problems.append("%s: %.1f steps/s, baseline %.1f (%.0f%% slower)"
+                            % (case["name"], case["steps_per_second"], old["steps_per_second"], 100 * (1 - ratio)))
+        if case["steps"] == old["steps"]:
+            for field in physics_fields:
+                if not np.isclose(case[field], old[field], rtol=rtol, atol=0):
+                    problems.append("%s: %s is %r, baseline %r" % (case["name"], field, case[field], old[field]))
+    return problems
@@ -0,0 +1,102 @@
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import simulation
+from chamber import random_scenarios
+
+code_version = None  # hash of the simulation sources, computed on first use
+
+
+# hash of every python source of the simulation, any code change gives new cache keys
+def get_code_version():
+    global code_version
+    if code_version is None:
+        root = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(root, "*.py")) + glob.glob(os.path.join(root, "Particles", "*.py"))):
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        code_version = digest.hexdigest()
+    return code_version
+
+
+def get_cache_key(config):
+    text = json.dumps({"config": config, "code": get_code_version()}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# run results in a directory of npz files named by the hash of config and code version; reading a
+# result marks it as recently used, and writing one evicts the least recently used past max_bytes
+class ResultCache:
+    def __init__(self, path, max_bytes=2 ** 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def get_path(self, config):
+        return os.path.join(self.path, get_cache_key(config) + ".npz")
+
+    # runs are reproducible when they draw no random numbers or draw them from a seed, others are never cached
+    @staticmethod
+    def is_cacheable(config):
+        return config["seed"] is not None or config["scenario"] not in random_scenarios
+
+    def get(self, config):
+        path = self.get_path(config)
+        if not self.is_cacheable(config) or not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                result = {name: data[name] for name in data.files if name != "config"}
+        except (OSError, ValueError):
+            return None  # removed by another process or unreadable, run again
+        os.utime(path)
+        return result
+
+    def put(self, config, result):
+        if not self.is_cacheable(config):
+            return
+        path = self.get_path(config)
+        temp_path = path + ".tmp"  # not matched by *.npz, so never evicted half-written
+        with open(temp_path, "wb") as f:
+            simulation.save_result(f, result, config)
+        os.replace(temp_path, path)
+        self.evict()
+
+    # remove least recently used results until the cache fits in max_bytes
+    def evict(self):
+        files = list()
+        for path in glob.glob(os.path.join(self.path, "*.npz")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.path, "*.npz")):
+            os.remove(path)
+
+
+# simulation.run through a cache, returns the result and whether it came from the cache
+def run_cached(config, cache):
+    result = cache.get(config)
+    if result is not None:
+        return result, True
+    result = simulation.run(config)
+    cache.put(config, result)
+    return result, False
@@ -1,15 +1,15 @@
 from math import sqrt
-from random import Random
 
+import numpy as np
 from Particles import particle
-from Particles.particle import Particle
-from Particles.triton import Triton
-from Particles.deuteron import Deuteron
-from Particles.helion import Helion
-from Particles.neutron import Neutron
-from scipy import constants as C
-from scipy.stats import norm
-import random
+from backends import get_backend
+from diagnostics import Diagnostics
+from initialization import get_gas, get_generator
+from forces import get_force_solver, get_potential_energy, kick, max_block_elements
+from integrators import get_integrator
+from neighbors import CellList
+from profiling import null_profiler
+from Particles.store import ParticleStore, DEUTERON, TRITON, HELION, NEUTRON, species_mass
 
 energy_released_in_MeV = 17.59
 neutron_energy_ratio = 0.7987
@@ -18,10 +18,13 @@ start_speeds = [1e6, 5e-12, 2e-12, 5e-12, 2e-12]
 wallCoeff = 0.3  # percent of grabbed energy
 chamber_sizes = [1e-2, 2e-10, 2e-10, 2e-10, 2e-10]
 fusion_distance_ratio = 5e-2
+random_scenarios = (1, 6)  # scenarios with a random gas, the others place their particles
 
 
 class Chamber:
-    def __init__(self, laser, x=1, y=1, z=1, scenario=1, particle_pairs=5):
+    def __init__(self, laser, x=1, y=1, z=1, scenario=1, particle_pairs=5, force_solver="direct", seed=None,
+                 timestep="global", max_level=10, eta=2.0, integrator="euler", backend="numpy",
+                 observable_intervals=None, profiler=None, velocities="fixed"):
         # chamber dimensions
         self.laser = laser
         self.x = float(x)
@@ -29,7 +32,9 @@ class Chamber:
         self.z = float(z)
         self.particle_pairs = particle_pairs
         self.scenario = scenario
-        self.particles = list()
+        self.rng = get_generator(seed)  # seed=None draws from OS entropy, a Generator is used as given
+        self.velocities = velocities  # "fixed" start speed or "maxwell" distributed, scenarios 1 and 6
+        self.store = ParticleStore()
         self.total_energy_released = 0
         self.reaction_count = 0
         self.sub_energy = 0
@@ -37,14 +42,28 @@ class Chamber:
         self.Pressure = 0  # [ Pa ]
         self.KEavg = 0
         self.Time = 0
-        self.iterator = 1
+        self.step_count = 0
         self.dt = 1e-9  # [ s ]
+        self.backend = get_backend(backend)  # "python", "numpy" or "jit", "jit" falls back to "numpy"
+        if force_solver == "direct":
+            force_solver = self.backend.get_direct_force()
+        self.force = get_force_solver(force_solver)
+        self.force_evaluations = 0  # accelerations computed, one per target particle
+        self.integrator = get_integrator(integrator)  # global timestep only
+        self.diagnostics = Diagnostics(observable_intervals)  # sampling intervals per metric, in steps
+        self.profiler = profiler or null_profiler  # phase timers and counters, see profiling.py
+        self.reference_energy = None  # total energy the energy drift is measured against
+        if timestep == "block" and self.integrator.name != "euler":
+            raise ValueError("block timesteps kick and drift with the euler scheme, got integrator "
+                             + self.integrator.name)
+        self.timestep = timestep  # "global" or "block"
+        self.max_level = max_level  # block mode, smallest step is dt / 2 ** max_level
+        self.eta = eta  # block mode, largest step as a fraction of the nearest neighbour distance
         self.min_fusion_dist = 5e-4
         self.set_up_scenario()
+        self.neighbors = CellList(self.min_fusion_dist, (self.x, self.y, self.z))
         self.surface_area = self.get_chamber_surface_area()
         self.laser_energy = self.laser.get_initial_energy(self.surface_area)
-        self.resultant_velocity = 0
-        self.avg_velocity = 0
         self.avg_vel = 0
 
     def set_up_scenario(self):
@@ -59,165 +78,238 @@ class Chamber:
             start_speed = start_speeds[self.scenario - 1]
         else:
             particle_energy = self.laser_energy / (self.particle_pairs * 2)
-            start_speed = sqrt(2 * particle_energy / Deuteron().mass_kg)
-        if self.scenario == 1 or self.scenario == 6:
-            for _ in range(0, self.particle_pairs):
-                x, y, z = self.get_random_position()
-                vx, vy, vz = self.get_random_velocity(1)
-                deuteron = Deuteron(x, y, z, vx, vy, vz)
-                deuteron.velocity = deuteron.velocity.normalize() * start_speed
-                self.particles.append(deuteron)
-                x, y, z = self.get_random_position()
-                vx, vy, vz = self.get_random_velocity(0)
-                triton = Triton(x, y, z, vx, vy, vz)
-                triton.velocity = triton.velocity.normalize() * start_speed
-                self.particles.append(triton)
+            start_speed = sqrt(2 * particle_energy / species_mass[DEUTERON])
+        store = self.store
+        if self.scenario in random_scenarios:
+            store.add_many(*get_gas(self.rng, self.particle_pairs, (self.x, self.y, self.z), start_speed,
+                                    self.velocities))
         elif self.scenario == 2 or self.scenario == 3:
-            deuteron = Deuteron(0, self.y / 2, self.z / 2, start_speed)
-            triton = Triton(self.x, self.y / 2, 1.01 * self.z / 2, -start_speed)
-            self.particles.append(deuteron)
-            self.particles.append(triton)
+            store.add(DEUTERON, 0, self.y / 2, self.z / 2, start_speed)
+            store.add(TRITON, self.x, self.y / 2, 1.01 * self.z / 2, -start_speed)
         elif self.scenario == 4 or self.scenario == 5:
-            deuteron = Deuteron(0, 0, self.z / 2, start_speed, start_speed)
-            triton = Triton(self.x, 0, 1.01 * self.z / 2, -start_speed, start_speed)
-            self.particles.append(deuteron)
-            self.particles.append(triton)
+            store.add(DEUTERON, 0, 0, self.z / 2, start_speed, start_speed)
+            store.add(TRITON, self.x, 0, 1.01 * self.z / 2, -start_speed, start_speed)
+
+    # per-particle views on the store, for code that still works with Particle objects
+    @property
+    def particles(self):
+        return self.store.views()
 
     # update particle parameters
     def update_particles(self):
-        current_max_v = 0
-        for i in range(0, len(self.particles)):
-            p1 = self.particles[i]
-            for j in range(0, len(self.particles)):
-                if i != j:
-                    p2 = self.particles[j]
-                    if self.fusion_can_occur(p1, p2):
-                        helion, neutron = self.execute_fusion(p1, p2)
-                        self.particles[i] = helion
-                        self.particles[j] = neutron
-                    p1.get_influence_from(p2, self.dt)
-            speed = p1.get_speed()
-            if speed > current_max_v:
-                current_max_v = speed
-        if self.scenario > 0 and current_max_v != 0:
-            self.set_dt(current_max_v)
-        for p in self.particles:
-            p.update_position(self.dt)
-
-        self.clip_to_bounds()
-        self.Time += self.dt
-
-    def fusion_can_occur(self, p1, p2):
-        if p1.get_distance_to(p2) < self.min_fusion_dist:
-            if (isinstance(p1, Triton) and isinstance(p2, Deuteron)) or (
-                    isinstance(p1, Deuteron) and isinstance(p2, Triton)):
-                return True
-        return False
-
-    # carry out nuclear fusion
-    def execute_fusion(self, deuteron, triton):
-        self.reaction_count += 1
-        self.total_energy_released += energy_released_in_MeV
+        if self.timestep == "block":
+            self.update_particles_block()
+            return
+        if self.fuse():
+            self.integrator.reset()
+        self.integrator.step(self)
+        self.update_observables()
+        self.step_count += 1
+        self.profiler.end_step(self)
+
+    # find and carry out this step's reactions, only pairs with a particle in targets if given; returns their number
+    def fuse(self, targets=None):
+        start = self.profiler.start()
+        reactions = self.execute_fusion(*self.get_fusion_pairs(targets))
+        self.profiler.stop("fusion", start)
+        return reactions
+
+    def get_accelerations(self, targets=None):
+        start = self.profiler.start()
+        store = self.store
+        evaluations = len(store) if targets is None else len(targets)
+        self.force_evaluations += evaluations
+        acc = self.force.get_accelerations(store.position, store.charge, store.mass, (self.x, self.y, self.z),
+                                           targets)
+        self.profiler.count("force_pairs", evaluations * len(store))
+        self.profiler.stop("forces", start)
+        return acc
+
+    # advance by one synchronisation step dt with hierarchical block timesteps: particle i is kicked
+    # every dt / 2 ** level[i], with its level set by its own speed and nearest neighbour distance,
+    # all particles drift together in substeps of the finest level in use. Between the sync points
+    # fusion is only checked for pairs with a particle starting its step
+    def update_particles_block(self):
+        store = self.store
+        speed = store.get_speeds()
+        if self.scenario > 0 and np.any(speed > 0):
+            # crossing step of the median particle, short enough that the fastest one needs at most max_level
+            # levels; with max_level=0 this is the step of the global timestep
+            self.set_dt(max(np.median(speed[speed > 0]), speed.max() / 2 ** self.max_level))
+        level = self.get_levels(speed, self.get_nearest_distances())
+        finest = int(level.max()) if len(level) else 0
+        substep = self.dt / 2 ** finest
+        for s in range(2 ** finest):
+            if s == 0:
+                self.fuse()
+                active = np.arange(len(store))
+            else:
+                active = np.flatnonzero(s % 2 ** (finest - level) == 0)
+                self.fuse(active)
+                # particles starting their own step may move to a finer level, or to a coarser one aligned with s
+                wanted = self.get_levels(store.get_speeds()[active], self.get_nearest_distances(active))
+                wanted = wanted.clip(max=finest)
+                aligned = s % 2 ** (finest - wanted) == 0
+                level[active[aligned]] = wanted[aligned]
+            if len(active):
+                velocity = store.velocity[active]
+                kick(velocity, self.get_accelerations(active), (self.dt / 2.0 ** level[active])[:, None],
+                     particle.max_speed)
+                store.velocity[active] = velocity
+            store.position += store.velocity * substep
+            self.clip_to_bounds()
+            self.Time += substep
+        self.levels = level
+        self.update_observables()
+        self.step_count += 1
+        self.profiler.end_step(self)
+
+    # level of every particle so that dt / 2 ** level is within both the chamber crossing step
+    # used by set_dt and eta times the distance to its nearest neighbour
+    def get_levels(self, speed, nearest):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            limit = np.minimum(self.get_crossing_distance(), self.eta * nearest) / speed
+            level = np.ceil(np.log2(self.dt / limit))
+        level = np.nan_to_num(level, nan=0, posinf=self.max_level, neginf=0)
+        return level.clip(0, self.max_level).astype(int)
+
+    # distance of the targets (all particles by default) to their nearest neighbour
+    def get_nearest_distances(self, targets=None):
+        from scipy.spatial import cKDTree
+
+        position = self.store.position
+        query = position if targets is None else position[targets]
+        if len(position) < 2 or len(query) == 0:
+            return np.full(len(query), np.inf)
+        distance, _ = cKDTree(position).query(query, k=2)
+        return distance[:, 1]
+
+    # deuteron-triton pairs that fuse this step, closest pairs first and every particle at most once
+    def get_fusion_pairs(self, targets=None):
+        store = self.store
+        if targets is None:
+            d, t = self.backend.get_close_pairs(self.neighbors, store.position, store.species, DEUTERON, TRITON,
+                                                self.min_fusion_dist)
+        else:
+            d, t = self.get_target_pairs(targets)
+        self.profiler.count("fusion_candidates", len(d))
+        r = store.position[t] - store.position[d]
+        order = np.lexsort((t, d, np.einsum('ij,ij->i', r, r)))
+        used = set()
+        chosen = list()
+        for k in order.tolist():
+            if d[k] not in used and t[k] not in used:
+                used.add(d[k])
+                used.add(t[k])
+                chosen.append(k)
+        return d[chosen], t[chosen]
+
+    # deuteron-triton pairs closer than the fusion distance with at least one of them in targets, targets
+    # are compared with every particle directly, or filtered from the full search when that is too large
+    def get_target_pairs(self, targets):
+        store = self.store
+        species = store.species
+        deuterons = np.flatnonzero(species == DEUTERON)
+        tritons = np.flatnonzero(species == TRITON)
+        if len(targets) * (len(deuterons) + len(tritons)) > max_block_elements:
+            d, t = self.backend.get_close_pairs(self.neighbors, store.position, species, DEUTERON, TRITON,
+                                                self.min_fusion_dist)
+            is_target = np.zeros(len(store), dtype=bool)
+            is_target[targets] = True
+            keep = is_target[d] | is_target[t]
+            return d[keep], t[keep]
+        first, second = list(), list()
+        target_deuterons = targets[species[targets] == DEUTERON]
+        target_tritons = targets[species[targets] == TRITON]
+        # a pair of two targets is found from its deuteron only
+        other_deuterons = np.setdiff1d(deuterons, target_deuterons, assume_unique=True)
+        for a, b, swap in ((target_deuterons, tritons, False), (target_tritons, other_deuterons, True)):
+            r = store.position[b][None, :, :] - store.position[a][:, None, :]
+            i, j = np.nonzero(np.einsum('ijk,ijk->ij', r, r) < self.min_fusion_dist ** 2)
+            first.append(b[j] if swap else a[i])
+            second.append(a[i] if swap else b[j])
+        return np.concatenate(first).astype(np.int64), np.concatenate(second).astype(np.int64)
 
-        helion = Helion(triton.position.x, triton.position.y, triton.position.z)
-        neutron = Neutron(deuteron.position.x, deuteron.position.y, deuteron.position.z)
+    # carry out nuclear fusion for paired index arrays, deuterons become neutrons and tritons helions,
+    # returns the number of reactions
+    def execute_fusion(self, deuteron, triton):
+        if len(deuteron) == 0:
+            return 0
+        store = self.store
+        self.reaction_count += len(deuteron)
+        self.profiler.count("reactions", len(deuteron))
+        self.total_energy_released += energy_released_in_MeV * len(deuteron)
 
-        input_energy = triton.get_kinetic_energy() + deuteron.get_kinetic_energy()
+        energy = store.get_kinetic_energies()
+        input_energy = energy[triton] + energy[deuteron]
         output_energy = input_energy + energy_released_in_MeV * MeV_in_Joules
         neutron_energy = neutron_energy_ratio * output_energy  # in Joules
         helion_energy = output_energy - neutron_energy  # in Joules
 
-        helion_speed = sqrt(2 * helion_energy / helion.mass_kg)
-        helion.velocity = triton.velocity.normalize() * helion_speed
+        speed = store.get_speeds()
+        store.set_species(triton, HELION)
+        helion_speed = np.sqrt(2 * helion_energy / store.mass[triton])
+        store.velocity[triton] *= (helion_speed / speed[triton])[:, None]
 
-        neutron_speed = sqrt(2 * neutron_energy / neutron.mass_kg)
-        neutron.velocity = deuteron.velocity.normalize() * neutron_speed
+        store.set_species(deuteron, NEUTRON)
+        neutron_speed = np.sqrt(2 * neutron_energy / store.mass[deuteron])
+        store.velocity[deuteron] *= (neutron_speed / speed[deuteron])[:, None]
+        return len(deuteron)
 
-        return helion, neutron
-
-    # clip particles inside the chamber
+    # clip particles inside the chamber, energy lost on the walls is shared out once per call
     def clip_to_bounds(self):
-        i = 0
-        self.KEavg = 0
-        for particle in self.particles:
-            m = particle.mass_kg
-            p = particle.position
-            v = particle.velocity
-            if p.x < 0:
-                v.x = self.set_bound_damping(v.x, m)
-                v.x = -v.x
-                p.x = 0
-            elif p.x > self.x:
-                v.x = self.set_bound_damping(v.x, m)
-                v.x = -v.x
-                p.x = self.x
-            if p.y < 0:
-                v.y = self.set_bound_damping(v.y, m)
-                v.y = -v.y
-                p.y = 0
-            elif p.y > self.y:
-                v.y = self.set_bound_damping(v.y, m)
-                v.y = -v.y
-                p.y = self.y
-            if p.z < 0:
-                v.z = self.set_bound_damping(v.z, m)
-                v.z = -v.z
-                p.z = 0
-            elif p.z > self.z:
-                v.z = self.set_bound_damping(v.z, m)
-                v.z = -v.z
-                p.z = self.z
-            i += 1
-            self.resultant_velocity = sqrt(v.x ** 2 + v.y ** 2 + v.z ** 2)
-            self.KEavg += ((m * (self.resultant_velocity ** 2)) / 2)
-            self.iterator += 1
-            self.avg_velocity += self.resultant_velocity
-        self.avg_vel = self.avg_velocity / len(self.particles)
-        self.Pressure = (len(self.particles) * self.KEavg / (self.x * self.y * self.z))
-        self.Temperature = ((self.KEavg / len(self.particles)) / (3 * C.k))
-        self.avg_velocity = 0
-
-    def get_random_position(self):
-        random = Random()
-        x = random.uniform(0, self.x)
-        y = random.uniform(0, self.y)
-        z = random.uniform(0, self.z)
-        return x, y, z
-
-    def gas_velocity(self, flag):
-        vsqr = 0
-        if flag == 1:
-            m = C.value("deuteron mass")
-        if flag == 0:
-            m = C.value("triton mass")
-        T = self.Temperature
-        vsqr += ((3 / 2) * C.k * T) / (1 * m / 2)
-        return sqrt(vsqr) / self.particle_pairs * 2
-
-    def get_random_velocity(self, flag):
-        random = Random()
-        v = self.gas_velocity(flag)
-        vx = random.uniform(-v, v)
-        vy = random.uniform(-v, v)
-        vz = random.uniform(-v, v)
-        return vx, vy, vz
-
-    def set_bound_damping(self, v, m):
-        KELost = (m * v ** 2 / 2) * wallCoeff
-        self.sub_energy += KELost
-        particle_count = len(self.particles)
-        energy_per_particle = KELost / particle_count
-        for i in range(0, particle_count):
-            p = self.particles[i]
-            p.add_energy(energy_per_particle)
-        return v * sqrt(1 - wallCoeff)
+        start = self.profiler.start()
+        store = self.store
+        lost_energy, bounces = self.backend.reflect(store.position, store.velocity, store.mass,
+                                                    (self.x, self.y, self.z), wallCoeff)
+        self.sub_energy += lost_energy
+        if lost_energy:
+            self.add_energy(lost_energy)
+        self.profiler.count("wall_bounces", bounces)
+        self.profiler.stop("walls", start)
+
+    # Temperature, Pressure, avg_vel and the other metrics, on the steps their interval is due
+    def update_observables(self):
+        start = self.profiler.start()
+        self.diagnostics.sample(self)
+        self.profiler.stop("observables", start)
+
+    def get_total_energy(self):
+        store = self.store
+        return np.sum(store.get_kinetic_energies()) + get_potential_energy(store.position, store.charge)
+
+    # relative change of the total energy since the first call, energy released by fusion is not counted
+    # as drift; walls only move energy between particles, the max_speed clamp does remove some
+    def get_energy_drift(self):
+        energy = self.get_total_energy() - self.total_energy_released * MeV_in_Joules
+        if self.reference_energy is None:
+            self.reference_energy = energy
+        return (energy - self.reference_energy) / abs(self.reference_energy)
+
+    # share energy equally between the moving particles by rescaling their speeds, particles at rest
+    # have no direction to speed up in
+    def add_energy(self, energy):
+        store = self.store
+        speed = store.get_speeds()
+        moving = speed > 0
+        if not np.any(moving):
+            return
+        energy_per_particle = energy / np.count_nonzero(moving)
+        new_speed = np.sqrt(speed[moving] ** 2 + 2 * energy_per_particle / store.mass[moving])
+        store.velocity[moving] *= (new_speed / speed[moving])[:, None]
 
     def set_dt(self, max_v):
+        dt = self.get_crossing_distance() / max_v  # so that it takes n frames to move across chamber
+        if dt != self.dt:
+            self.profiler.count("dt_changes")
+        self.dt = dt
+
+    def get_crossing_distance(self):
         if self.scenario == 1 or self.scenario == 6:
             n_frames = 5
         else:
             n_frames = 20
-        self.dt = (self.x / n_frames) / max_v  # so that it takes n frames to move across chamber
+        return self.x / n_frames
 
     def get_chamber_surface_area(self):
         return 2 * (self.x * self.y + self.x * self.z + self.y * self.z)
@@ -0,0 +1,61 @@
+import json
+import os
+
+import numpy as np
+
+from chamber import Chamber
+from laser import Laser
+from neighbors import CellList
+
+# scalar chamber attributes needed to continue a run exactly
+chamber_state = ("x", "y", "z", "scenario", "particle_pairs", "min_fusion_dist", "Time", "dt", "step_count",
+                 "reaction_count", "total_energy_released", "sub_energy", "Temperature", "Pressure", "KEavg",
+                 "avg_vel", "laser_energy", "surface_area", "force_evaluations",
+                 "timestep", "max_level", "eta", "reference_energy", "velocities")
+laser_state = ("wavelength", "intensity", "activation_time")
+
+
+def get_state(chamber):
+    state = {name: getattr(chamber, name) for name in chamber_state}
+    state["laser"] = {name: getattr(chamber.laser, name) for name in laser_state}
+    state["rng"] = chamber.rng.bit_generator.state
+    state["integrator"] = chamber.integrator.name
+    state["diagnostics"] = chamber.diagnostics.get_state()
+    return state
+
+
+# write the full chamber state to an uncompressed npz, replacing path atomically; with a recorder
+# (flushed just before) its chunk counters are saved too
+def save_checkpoint(path, chamber, recorder=None):
+    store = chamber.store
+    state = get_state(chamber)
+    if recorder is not None and recorder.path is not None:
+        state["recorder"] = recorder.get_state()
+    state = json.dumps(state, default=float)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(f, state=state, position=store.position, velocity=store.velocity, species=store.species)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path, force_solver="direct", backend="numpy"):
+    with np.load(path) as data:
+        state = json.loads(str(data["state"]))
+        position, velocity, species = data["position"], data["velocity"], data["species"]
+    laser = Laser(**state.pop("laser"))
+    chamber = Chamber(laser, state["x"], state["y"], state["z"], state["scenario"], state["particle_pairs"],
+                      force_solver, integrator=state.pop("integrator"), backend=backend)
+    chamber.rng.bit_generator.state = state.pop("rng")
+    chamber.diagnostics.set_state(state.pop("diagnostics"))
+    state.pop("recorder", None)
+    for name, value in state.items():
+        setattr(chamber, name, value)
+    chamber.neighbors = CellList(chamber.min_fusion_dist, (chamber.x, chamber.y, chamber.z))
+    chamber.store.add_many(species, position, velocity)
+    return chamber
+
+
+# recorder chunk counters saved with the checkpoint, None if it was written without a recording
+def load_recorder_state(path):
+    with np.load(path) as data:
+        return json.loads(str(data["state"])).get("recorder")
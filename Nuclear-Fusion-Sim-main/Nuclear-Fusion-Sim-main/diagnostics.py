@@ -0,0 +1,124 @@
+import numpy as np
+from scipy import constants as C
+
+from Particles.store import species_classes
+
+# sampling interval in steps of every metric, a metric is only computed on steps that are a multiple of it
+default_intervals = {
+    "thermodynamics": 1,  # Temperature, Pressure, avg_vel and KEavg of the chamber
+    "species_temperature": 10,
+    "energy_histogram": 100,
+    "reaction_rate": 1,
+}
+energy_bins = np.linspace(-25, -10, 61)  # log10 of the particle kinetic energy [J]
+
+
+# streaming mean and variance (Welford), values may be scalars or arrays of a fixed shape
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else self.m2 * 0.0
+
+    def get_state(self):
+        return {"count": self.count, "mean": np.asarray(self.mean).tolist(), "m2": np.asarray(self.m2).tolist()}
+
+    def set_state(self, state):
+        self.count = state["count"]
+        self.mean = np.asarray(state["mean"]) if isinstance(state["mean"], list) else state["mean"]
+        self.m2 = np.asarray(state["m2"]) if isinstance(state["m2"], list) else state["m2"]
+
+
+# observables of a chamber as reductions over the particle arrays, every metric on its own interval;
+# the squared speeds and kinetic energies are computed once per sampled step and shared between metrics
+class Diagnostics:
+    def __init__(self, intervals=None):
+        self.intervals = dict(default_intervals)
+        if intervals:
+            for name, interval in intervals.items():
+                if name not in default_intervals:
+                    raise KeyError("unknown metric: " + name)
+                self.intervals[name] = interval
+        self.stats = dict()
+        self.species_temperature = np.zeros(len(species_classes))
+        self.energy_histogram = np.zeros(len(energy_bins) - 1, dtype=np.int64)
+        self.reaction_rate = 0.0
+        self.last_reactions = 0
+        self.last_time = 0.0
+
+    def is_due(self, name, step):
+        interval = self.intervals[name]
+        return bool(interval) and step % interval == 0
+
+    def add(self, name, value):
+        if name not in self.stats:
+            self.stats[name] = RunningStats()
+        self.stats[name].add(value)
+
+    def sample(self, chamber):
+        step = chamber.step_count
+        due = [name for name in self.intervals if self.is_due(name, step)]
+        if not due:
+            return
+        store = chamber.store
+        n = len(store)
+        if n and set(due) - {"reaction_rate"}:
+            speed2 = np.einsum('ij,ij->i', store.velocity, store.velocity)
+            energy = store.mass * speed2 / 2
+        if "thermodynamics" in due and n:
+            chamber.KEavg = energy.sum()
+            chamber.avg_vel = np.sqrt(speed2).mean()
+            chamber.Pressure = n * chamber.KEavg / (chamber.x * chamber.y * chamber.z)
+            chamber.Temperature = chamber.KEavg / n / (3 * C.k)
+            self.add("temperature", chamber.Temperature)
+            self.add("pressure", chamber.Pressure)
+            self.add("avg_velocity", chamber.avg_vel)
+            self.add("kinetic_energy", chamber.KEavg)
+        if "species_temperature" in due and n:
+            count = np.bincount(store.species, minlength=len(species_classes))
+            total = np.bincount(store.species, energy, minlength=len(species_classes))
+            self.species_temperature = np.divide(total, count * 3 * C.k, out=np.zeros(len(count)), where=count > 0)
+            self.add("species_temperature", self.species_temperature)
+        if "energy_histogram" in due and n:
+            with np.errstate(divide='ignore'):
+                log_energy = np.log10(energy)
+            log_energy = log_energy.clip(energy_bins[0], energy_bins[-1])  # out of range energies go to the end bins
+            self.energy_histogram = np.histogram(log_energy, energy_bins)[0]
+            self.add("energy_histogram", self.energy_histogram)
+        if "reaction_rate" in due:
+            elapsed = chamber.Time - self.last_time
+            reactions = chamber.reaction_count - self.last_reactions
+            self.reaction_rate = reactions / elapsed if elapsed > 0 else 0.0
+            self.last_reactions, self.last_time = chamber.reaction_count, chamber.Time
+            self.add("reaction_rate", self.reaction_rate)
+
+    # mean and variance of every sampled value as name_mean / name_variance
+    def get_summary(self):
+        summary = dict()
+        for name, stats in self.stats.items():
+            summary[name + "_mean"] = stats.mean
+            summary[name + "_variance"] = stats.variance
+        return summary
+
+    def get_state(self):
+        return {"intervals": self.intervals, "last_reactions": self.last_reactions, "last_time": self.last_time,
+                "stats": {name: stats.get_state() for name, stats in self.stats.items()}}
+
+    def set_state(self, state):
+        self.intervals = state["intervals"]
+        self.last_reactions = state["last_reactions"]
+        self.last_time = state["last_time"]
+        self.stats = dict()
+        for name, stats_state in state["stats"].items():
+            self.stats[name] = RunningStats()
+            self.stats[name].set_state(stats_state)
@@ -0,0 +1,249 @@
+import numpy as np
+from scipy import constants as C
+
+import forces
+import simulation
+from diagnostics import default_intervals
+from chamber import energy_released_in_MeV, neutron_energy_ratio, MeV_in_Joules, wallCoeff
+from Particles import particle
+from recorder import observables
+from Particles.store import DEUTERON, TRITON, HELION, NEUTRON, species_mass, species_charge
+
+# chamber attributes copied back by Ensemble.unpack
+member_state = ("Time", "dt", "step_count", "reaction_count", "total_energy_released", "sub_energy", "Temperature",
+                "Pressure", "KEavg", "avg_vel")
+
+
+# M independent chambers with N particles each stepped together as (M, N) arrays, with the
+# euler scheme of Chamber and a per-member dt, box, clock and reaction count. Meant for many tiny
+# chambers (scenarios 1-5), forces are exact all-pairs sums within each member
+class Ensemble:
+    def __init__(self, chambers):
+        self.chambers = chambers
+        sizes = {len(chamber.store) for chamber in chambers}
+        if len(sizes) != 1:
+            raise ValueError("ensemble members must have the same number of particles, got %s" % sorted(sizes))
+        n = sizes.pop()
+        if n * n > forces.max_block_elements:
+            raise ValueError("ensemble members are limited to %d particles, got %d"
+                             % (int(np.sqrt(forces.max_block_elements)), n))
+        for chamber in chambers:
+            if chamber.timestep != "global" or chamber.integrator.name != "euler":
+                raise ValueError("ensemble members must use the global timestep and the euler integrator")
+            if type(chamber.force) is not forces.DirectForce or chamber.backend.name != "numpy":
+                raise ValueError("ensemble members must use the direct force solver and the numpy backend")
+            if chamber.diagnostics.intervals != default_intervals:
+                raise ValueError("ensemble members must use the default observable intervals")
+        self.position = np.stack([chamber.store.position for chamber in chambers])
+        self.velocity = np.stack([chamber.store.velocity for chamber in chambers])
+        self.species = np.stack([chamber.store.species for chamber in chambers])
+        self.mass = species_mass[self.species]
+        self.charge = species_charge[self.species]
+        self.bounds = np.array([(chamber.x, chamber.y, chamber.z) for chamber in chambers])
+        self.scenario = np.array([chamber.scenario for chamber in chambers])
+        self.min_fusion_dist = np.array([chamber.min_fusion_dist for chamber in chambers])
+        self.crossing_distance = np.array([chamber.get_crossing_distance() for chamber in chambers])
+        for name in member_state:
+            setattr(self, name, np.array([getattr(chamber, name) for chamber in chambers], dtype=float))
+        self.step_count = self.step_count.astype(int)
+        self.reaction_count = self.reaction_count.astype(int)
+        self.active = np.ones(len(chambers), dtype=bool)
+
+    @classmethod
+    def from_configs(cls, configs):
+        return cls([build_chamber(config) for config in configs])
+
+    def __len__(self):
+        return len(self.chambers)
+
+    # one euler step of every active member: fusion, kick, new dt, drift, walls, observables
+    def step(self):
+        self.fuse()
+        dt = np.where(self.active, self.dt, 0)[:, None, None]
+        speed = forces.kick(self.velocity.reshape(-1, 3), (dt * self.get_accelerations()).reshape(-1, 3), 1,
+                            particle.max_speed).reshape(self.species.shape)
+        max_v = speed.max(axis=1)
+        new_dt = self.active & (self.scenario > 0) & (max_v != 0)
+        self.dt[new_dt] = self.crossing_distance[new_dt] / max_v[new_dt]
+        dt = np.where(self.active, self.dt, 0)
+        self.position += self.velocity * dt[:, None, None]
+        self.clip_to_bounds()
+        self.Time += dt
+        self.update_observables()
+        self.step_count += self.active
+
+    # consecutive member ranges whose (N, N) pair arrays together stay under max_block_elements
+    def get_chunks(self):
+        n = self.species.shape[1]
+        size = max(1, forces.max_block_elements // max(n * n, 1))
+        return [slice(start, start + size) for start in range(0, len(self), size)]
+
+    # exact coulomb accelerations within every member, (M, N, 3)
+    def get_accelerations(self):
+        acc = np.empty_like(self.position)
+        for chunk in self.get_chunks():
+            position, charge = self.position[chunk], self.charge[chunk]
+            r = position[:, None, :, :] - position[:, :, None, :]  # from particle i to particle j
+            dist2 = np.einsum('mijk,mijk->mij', r, r)
+            with np.errstate(divide='ignore'):
+                inv_dist3 = np.where(dist2 > 0, dist2 ** -1.5, 0)
+            weights = charge[:, None, :] * inv_dist3
+            field = np.einsum('mij,mijk->mik', weights, r)
+            acc[chunk] = -forces.force_constant * charge[:, :, None] * field / self.mass[chunk, :, None]
+        return acc
+
+    # deuteron-triton pairs closer than the member's fusion distance fuse, closest first and every
+    # particle at most once, as in Chamber.get_fusion_pairs
+    def fuse(self):
+        members, deuterons, tritons = list(), list(), list()
+        for chunk in self.get_chunks():
+            m, d, t = self.get_fusion_pairs(chunk)
+            members.append(m + chunk.start)
+            deuterons.append(d)
+            tritons.append(t)
+        members = np.concatenate(members)
+        if len(members):
+            self.execute_fusion(members, np.concatenate(deuterons), np.concatenate(tritons))
+
+    # (member, deuteron, triton) of the reactions in a chunk of members, members counted from the chunk start
+    def get_fusion_pairs(self, chunk):
+        position, species = self.position[chunk], self.species[chunk]
+        m_count, n = species.shape
+        r = position[:, None, :, :] - position[:, :, None, :]
+        dist2 = np.einsum('mijk,mijk->mij', r, r)
+        candidate = (species[:, :, None] == DEUTERON) & (species[:, None, :] == TRITON) \
+            & (dist2 < self.min_fusion_dist[chunk, None, None] ** 2) & self.active[chunk, None, None]
+        if not np.any(candidate):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        dist2 = np.where(candidate, dist2, np.inf)
+        members, deuterons, tritons = list(), list(), list()
+        rows = np.arange(m_count)
+        while True:
+            k = dist2.reshape(m_count, n * n).argmin(axis=1)  # ties go to the lower deuteron, then triton
+            d, t = k // n, k % n
+            found = np.isfinite(dist2[rows, d, t])
+            if not np.any(found):
+                break
+            m, d, t = rows[found], d[found], t[found]
+            members.append(m)
+            deuterons.append(d)
+            tritons.append(t)
+            for index in (d, t):
+                dist2[m, index, :] = np.inf
+                dist2[m, :, index] = np.inf
+        return np.concatenate(members), np.concatenate(deuterons), np.concatenate(tritons)
+
+    def execute_fusion(self, m, deuteron, triton):
+        np.add.at(self.reaction_count, m, 1)
+        np.add.at(self.total_energy_released, m, energy_released_in_MeV)
+        velocity = self.velocity
+        speed = np.sqrt(np.einsum('mij,mij->mi', velocity, velocity))
+        energy = self.mass * speed ** 2 / 2
+        output_energy = energy[m, triton] + energy[m, deuteron] + energy_released_in_MeV * MeV_in_Joules
+        neutron_energy = neutron_energy_ratio * output_energy
+        helion_energy = output_energy - neutron_energy
+        for index, species, new_energy in ((triton, HELION, helion_energy), (deuteron, NEUTRON, neutron_energy)):
+            self.species[m, index] = species
+            self.mass[m, index] = species_mass[species]
+            self.charge[m, index] = species_charge[species]
+            new_speed = np.sqrt(2 * new_energy / self.mass[m, index])
+            velocity[m, index] *= (new_speed / speed[m, index])[:, None]
+
+    # reflect at every member's walls, energy lost on the walls is shared out within the member
+    def clip_to_bounds(self):
+        position, velocity = self.position, self.velocity
+        lost_energy = np.zeros(len(self))
+        for axis in range(3):
+            bound = self.bounds[:, axis, None]
+            low = position[:, :, axis] < 0
+            high = position[:, :, axis] > bound
+            hit = low | high
+            if np.any(hit):
+                v = velocity[:, :, axis]
+                lost_energy += np.sum(np.where(hit, self.mass * v ** 2 / 2, 0), axis=1) * wallCoeff
+                velocity[:, :, axis] = np.where(hit, -v * np.sqrt(1 - wallCoeff), v)
+                position[:, :, axis] = np.where(low, 0, np.where(high, bound, position[:, :, axis]))
+        self.sub_energy += lost_energy
+        if np.any(lost_energy):
+            self.add_energy(lost_energy)
+
+    # energy per member shared between its moving particles, as in Chamber.add_energy
+    def add_energy(self, energy):
+        speed = np.sqrt(np.einsum('mij,mij->mi', self.velocity, self.velocity))
+        moving = (speed > 0) & (energy > 0)[:, None]
+        energy_per_particle = energy / np.maximum(np.count_nonzero(moving, axis=1), 1)
+        new_speed = np.sqrt(speed ** 2 + 2 * energy_per_particle[:, None] / self.mass)
+        scale = np.ones_like(speed)
+        scale[moving] = new_speed[moving] / speed[moving]
+        self.velocity *= scale[:, :, None]
+
+    def update_observables(self):
+        n = self.species.shape[1]
+        speed2 = np.einsum('mij,mij->mi', self.velocity, self.velocity)
+        kinetic_energy = np.sum(self.mass * speed2 / 2, axis=1)
+        active = self.active
+        self.KEavg[active] = kinetic_energy[active]
+        self.avg_vel[active] = np.sqrt(speed2).mean(axis=1)[active]
+        self.Pressure[active] = (n * kinetic_energy / np.prod(self.bounds, axis=1))[active]
+        self.Temperature[active] = (kinetic_energy / n / (3 * C.k))[active]
+
+    # step until every member passed its stop_time or made max_steps steps
+    def run(self, stop_time, max_steps=None):
+        stop_time = np.broadcast_to(np.asarray(stop_time, dtype=float), (len(self),))
+        max_steps = np.broadcast_to(np.asarray(np.inf if max_steps is None else max_steps, dtype=float),
+                                    (len(self),))
+        while True:
+            self.active = (self.Time <= stop_time) & (self.step_count < max_steps)
+            if not np.any(self.active):
+                break
+            self.step()
+        self.active = np.ones(len(self), dtype=bool)
+
+    # final observables and particle state of every member, with the keys simulation.get_final_state
+    # gives a simulation.run result
+    def get_results(self):
+        results = list()
+        for i in range(len(self)):
+            result = {"steps": int(self.step_count[i]), "position": self.position[i].copy(),
+                      "velocity": self.velocity[i].copy(), "species": self.species[i].copy(),
+                      "bounds": self.bounds[i].copy()}
+            for name, attribute in observables.items():
+                result["final_" + name] = getattr(self, attribute)[i].item()
+            results.append(result)
+        return results
+
+    # copy the ensemble state back into the member chambers
+    def unpack(self):
+        for i, chamber in enumerate(self.chambers):
+            store = chamber.store
+            store.position = self.position[i].copy()
+            store.velocity = self.velocity[i].copy()
+            store.species = self.species[i].copy()
+            store.mass = self.mass[i].copy()
+            store.charge = self.charge[i].copy()
+            for name in member_state:
+                setattr(chamber, name, getattr(self, name)[i].item())
+
+
+# chamber of a config, rejecting the run options an ensemble has no equivalent for
+def build_chamber(config):
+    if config["energy_diagnostic"]:
+        raise ValueError("ensembles do not support the energy drift diagnostic")
+    return simulation.build_chamber(config)
+
+
+# run configs as ensembles, one per particle count, results are in the order of configs
+def run_ensemble(configs):
+    chambers = [build_chamber(config) for config in configs]
+    groups = dict()
+    for i, chamber in enumerate(chambers):
+        groups.setdefault(len(chamber.store), list()).append(i)
+    results = [None] * len(configs)
+    for members in groups.values():
+        ensemble = Ensemble([chambers[i] for i in members])
+        ensemble.run([configs[i]["stop_time"] for i in members],
+                     [np.inf if configs[i]["max_steps"] is None else configs[i]["max_steps"] for i in members])
+        for i, result in zip(members, ensemble.get_results()):
+            results[i] = result
+    return results
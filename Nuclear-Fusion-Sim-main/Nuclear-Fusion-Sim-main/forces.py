@@ -0,0 +1,262 @@
+import time
+
+import numpy as np
+from scipy import constants as C
+
+# constant of the pair force law, the same scipy constant Particle.get_influence_from uses
+# (note that scipy's C.k is the Boltzmann constant, not the coulomb constant 1 / (4 pi eps0))
+force_constant = C.k
+max_block_elements = 2 ** 21  # pair interactions held in memory at once
+
+
+# rows per block so that a block of n-wide pair arrays stays under max_block_elements
+def get_block_size(n, block_size=None):
+    if block_size:
+        return block_size
+    return max(1, max_block_elements // max(n, 1))
+
+
+# exact all-pairs coulomb accelerations, evaluated in row blocks to cap memory
+class DirectForce:
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+
+    # accelerations of the targets (all particles by default) from every particle
+    def get_accelerations(self, position, charge, mass, bounds=None, targets=None):
+        if targets is None:
+            targets = np.arange(len(position))
+        acc = np.zeros((len(targets), 3))
+        block = get_block_size(len(position), self.block_size)
+        for start in range(0, len(targets), block):
+            index = targets[start:start + block]
+            acc[start:start + block] = self.get_block_accelerations(position, charge, position[index],
+                                                                    charge[index]) / mass[index, None]
+        return acc
+
+    # force per unit of target mass on targets from every source particle
+    @staticmethod
+    def get_block_accelerations(position, charge, target_position, target_charge):
+        r = position[None, :, :] - target_position[:, None, :]  # vectors from targets to sources
+        dist2 = np.einsum('ijk,ijk->ij', r, r)
+        with np.errstate(divide='ignore'):
+            inv_dist3 = np.where(dist2 > 0, dist2 ** -1.5, 0)  # skip self and coincident particles
+        weights = charge[None, :] * inv_dist3
+        return -force_constant * target_charge[:, None] * np.einsum('ij,ijk->ik', weights, r)
+
+
+# add dt * acc to velocities and keep every speed below max_v
+def kick(velocity, acc, dt, max_v):
+    velocity += dt * acc
+    speed = np.sqrt(np.einsum('ij,ij->i', velocity, velocity))
+    too_fast = speed > max_v
+    if np.any(too_fast):
+        velocity[too_fast] *= (max_v / speed[too_fast])[:, None]
+    return speed.clip(max=max_v)
+
+
+morton_bits = 21  # octree depth limit, 3 * 21 bits fit into one 64-bit key
+
+
+def spread_bits(v):
+    v = v & np.uint64(0x1fffff)
+    v = (v | v << np.uint64(32)) & np.uint64(0x1f00000000ffff)
+    v = (v | v << np.uint64(16)) & np.uint64(0x1f0000ff0000ff)
+    v = (v | v << np.uint64(8)) & np.uint64(0x100f00f00f00f00f)
+    v = (v | v << np.uint64(4)) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | v << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return v
+
+
+# octree over a box, nodes are contiguous ranges of particles sorted along a morton curve
+class Octree:
+    def __init__(self, position, charge, lo, hi, leaf_size=16):
+        n = len(position)
+        cells = np.floor((position - lo) / (hi - lo) * 2 ** morton_bits)
+        cells = cells.clip(0, 2 ** morton_bits - 1).astype(np.uint64)
+        keys = spread_bits(cells[:, 0]) << np.uint64(2) | spread_bits(cells[:, 1]) << np.uint64(1) \
+            | spread_bits(cells[:, 2])
+        self.order = np.argsort(keys, kind='stable')
+        keys = keys[self.order]
+        self.position = position[self.order]
+        self.charge = charge[self.order]
+
+        # build level by level, only nodes holding more than leaf_size particles are split
+        starts, ends, levels, first_child, n_children = [np.array([0])], [np.array([n])], [np.array([0])], [], []
+        level_offset = 0
+        for level in range(1, morton_bits + 1):
+            parent_start, parent_end = starts[-1], ends[-1]
+            split = parent_end - parent_start > leaf_size
+            if not np.any(split):
+                break
+            prefix = keys >> np.uint64(3 * (morton_bits - level))
+            run_start = np.concatenate([[0], np.flatnonzero(prefix[1:] != prefix[:-1]) + 1])
+            run_end = np.concatenate([run_start[1:], [n]])
+            parent = np.searchsorted(parent_start, run_start, side='right') - 1
+            keep = (parent >= 0) & (run_start < parent_end[parent.clip(0)]) & split[parent.clip(0)]
+            run_start, run_end = run_start[keep], run_end[keep]
+            first = np.searchsorted(run_start, parent_start)
+            count = np.searchsorted(run_start, parent_end) - first
+            level_offset += len(parent_start)  # global index of the first child level node
+            first_child.append(np.where(split, first + level_offset, -1))
+            n_children.append(np.where(split, count, 0))
+            starts.append(run_start)
+            ends.append(run_end)
+            levels.append(np.full(len(run_start), level))
+        first_child.append(np.full(len(starts[-1]), -1))
+        n_children.append(np.zeros(len(starts[-1]), dtype=int))
+
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.first_child = np.concatenate(first_child)
+        self.n_children = np.concatenate(n_children)
+        self.size = (hi - lo).max() / 2.0 ** np.concatenate(levels)
+
+        # monopole of every node, placed at the center of absolute charge
+        total_charge = np.concatenate([[0], np.cumsum(self.charge)])
+        weight = np.abs(self.charge)
+        total_weight = np.concatenate([[0], np.cumsum(weight)])
+        weighted = np.concatenate([np.zeros((1, 3)), np.cumsum(self.position * weight[:, None], axis=0)])
+        self.node_charge = total_charge[self.end] - total_charge[self.start]
+        node_weight = total_weight[self.end] - total_weight[self.start]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.center = (weighted[self.end] - weighted[self.start]) / node_weight[:, None]
+        self.center[node_weight == 0] = 0  # neutral nodes do not act on anything
+
+    def __len__(self):
+        return len(self.start)
+
+
+# expand every pair into (pair index, offset) for offsets 0..count-1
+def expand(count):
+    pair = np.repeat(np.arange(len(count)), count)
+    offset = np.arange(len(pair)) - np.repeat(np.cumsum(count) - count, count)
+    return pair, offset
+
+
+# approximate coulomb accelerations from an octree with opening angle theta, O(N log N)
+class BarnesHutForce:
+    def __init__(self, theta=0.5, leaf_size=16, chunk_size=4096):
+        self.theta = theta
+        self.leaf_size = leaf_size
+        self.chunk_size = chunk_size
+
+    def get_accelerations(self, position, charge, mass, bounds=None, targets=None):
+        n = len(position)
+        if targets is None:
+            targets = np.arange(n)
+        if len(targets) == 0:
+            return np.zeros((0, 3))
+        lo = position.min(axis=0)
+        hi = position.max(axis=0)
+        if bounds is not None:
+            lo = np.minimum(lo, 0)
+            hi = np.maximum(hi, bounds)
+        hi = np.where(hi > lo, hi, lo + 1)
+        tree = Octree(position, charge, lo, hi, self.leaf_size)
+        rank = np.empty(n, dtype=int)
+        rank[tree.order] = np.arange(n)
+        tree_targets = rank[targets]
+        field = np.zeros((len(targets), 3))
+        for start in range(0, len(targets), self.chunk_size):
+            field[start:start + self.chunk_size] = self.get_field(tree, tree_targets[start:start + self.chunk_size])
+        return -force_constant * (charge[targets] / mass[targets])[:, None] * field
+
+    # sum of q_s * r / |r|^3 over sources for the given targets (indices in tree order)
+    def get_field(self, tree, targets):
+        field = np.zeros((len(targets), 3))
+        target = np.arange(len(targets))
+        node = np.zeros(len(targets), dtype=int)
+        theta2 = self.theta ** 2
+        while len(target):
+            t = targets[target]
+            r = tree.center[node] - tree.position[t]
+            dist2 = np.einsum('ij,ij->i', r, r)
+            inside = (tree.start[node] <= t) & (t < tree.end[node])
+            accept = ~inside & (tree.size[node] ** 2 < theta2 * dist2)
+            self.add_field(field, target[accept], tree.node_charge[node[accept]], r[accept], dist2[accept])
+
+            opened = ~accept
+            leaf = opened & (tree.n_children[node] == 0)
+            if np.any(leaf):
+                leaf_target, leaf_node = target[leaf], node[leaf]
+                pair, offset = expand(tree.end[leaf_node] - tree.start[leaf_node])
+                source = tree.start[leaf_node][pair] + offset
+                pair_target = leaf_target[pair]
+                keep = source != targets[pair_target]
+                source, pair_target = source[keep], pair_target[keep]
+                r = tree.position[source] - tree.position[targets[pair_target]]
+                self.add_field(field, pair_target, tree.charge[source], r, np.einsum('ij,ij->i', r, r))
+
+            internal = opened & ~leaf
+            pair, offset = expand(tree.n_children[node[internal]])
+            target = target[internal][pair]
+            node = tree.first_child[node[internal]][pair] + offset
+        return field
+
+    @staticmethod
+    def add_field(field, target, source_charge, r, dist2):
+        with np.errstate(divide='ignore'):
+            weight = np.where(dist2 > 0, source_charge * dist2 ** -1.5, 0)
+        for axis in range(3):
+            field[:, axis] += np.bincount(target, weight * r[:, axis], minlength=len(field))
+
+
+force_solvers = {"direct": DirectForce, "barnes-hut": BarnesHutForce}
+
+
+# force solver from a name in force_solvers or an object with get_accelerations
+def get_force_solver(solver, **options):
+    if isinstance(solver, str):
+        return force_solvers[solver](**options)
+    return solver
+
+
+# accuracy of a force solver against the exact all-pairs sum on a sample of particles
+def compare_forces(position, charge, mass, solver, bounds=None, sample=1000, seed=0):
+    n = len(position)
+    index = np.arange(n)
+    if n > sample:
+        index = np.sort(np.random.default_rng(seed).choice(n, sample, replace=False))
+    start = time.perf_counter()
+    approx = solver.get_accelerations(position, charge, mass, bounds)[index]
+    solver_time = time.perf_counter() - start
+    exact = DirectForce.get_block_accelerations(position, charge, position[index], charge[index]) / mass[index, None]
+    error = np.linalg.norm(approx - exact, axis=1)
+    norm = np.linalg.norm(exact, axis=1)
+    relative = error / np.where(norm > 0, norm, 1)
+    return {
+        "particles": n,
+        "sampled": len(index),
+        "solver_time": solver_time,
+        "mean_error": float(relative.mean()),
+        "rms_error": float(np.sqrt((relative ** 2).mean())),
+        "max_error": float(relative.max()),
+    }
+
+
+# error-vs-exact table for a range of opening angles, to pick theta for a chamber
+def theta_report(chamber, thetas=(0.2, 0.3, 0.5, 0.7, 1.0), sample=1000):
+    store = chamber.store
+    bounds = (chamber.x, chamber.y, chamber.z)
+    report = list()
+    for theta in thetas:
+        result = compare_forces(store.position, store.charge, store.mass, BarnesHutForce(theta), bounds, sample)
+        result["theta"] = theta
+        report.append(result)
+    return report
+
+
+# coulomb potential energy k * sum over pairs i < j of q_i q_j / r_ij, exact and blocked like DirectForce
+def get_potential_energy(position, charge, block_size=None):
+    n = len(position)
+    block = get_block_size(n, block_size)
+    energy = 0.0
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        r = position[None, :, :] - position[start:stop, None, :]
+        dist2 = np.einsum('ijk,ijk->ij', r, r)
+        upper = np.arange(n)[None, :] > np.arange(start, stop)[:, None]
+        with np.errstate(divide='ignore'):
+            inv_dist = np.where(upper & (dist2 > 0), dist2 ** -0.5, 0)
+        energy += charge[start:stop] @ inv_dist @ charge
+    return force_constant * energy
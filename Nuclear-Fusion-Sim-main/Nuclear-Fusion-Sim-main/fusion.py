@@ -0,0 +1,222 @@
+import argparse
+import sys
+import time
+
+import simulation
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--config", help="JSON file with run parameters, flags override it")
+    parser.add_argument("--scenario", type=int)
+    parser.add_argument("--pairs", dest="particle_pairs", type=int, help="number of D+T pairs (scenarios 1 and 6)")
+    parser.add_argument("--stop-time", dest="stop_time", type=float, help="simulated time [s]")
+    parser.add_argument("--wavelength", type=float, help="laser wavelength [m]")
+    parser.add_argument("--intensity", type=float, help="laser intensity [W/m^2]")
+    parser.add_argument("--activation-time", dest="activation_time", type=float, help="laser activation time [s]")
+    parser.add_argument("--force-solver", dest="force_solver", choices=["direct", "barnes-hut", "shared"])
+    parser.add_argument("--force-workers", dest="force_workers", type=int,
+                        help="processes sharing one direct force evaluation (shared solver) [all cores]")
+    parser.add_argument("--theta", type=float, help="barnes-hut opening angle")
+    parser.add_argument("--timestep", choices=["global", "block"],
+                        help="one step for all particles, or per-particle block steps synchronised every dt (euler only)")
+    parser.add_argument("--integrator", choices=["euler", "leapfrog", "velocity-verlet"])
+    parser.add_argument("--backend", choices=["python", "numpy", "jit"],
+                        help="kernels for the direct force, fusion and walls, jit needs numba")
+    parser.add_argument("--energy-drift", dest="energy_diagnostic", action="store_const", const=True,
+                        help="report the relative drift of the total energy")
+    parser.add_argument("--velocities", choices=["fixed", "maxwell"],
+                        help="initial velocities in scenarios 1 and 6: one start speed, or Maxwell-Boltzmann")
+    parser.add_argument("--max-steps", dest="max_steps", type=int)
+    parser.add_argument("--seed", type=int, help="seed for the initial particle state")
+
+
+def get_config(args):
+    overrides = [simulation.load_config(args.config)] if args.config else []
+    flags = {key: getattr(args, key) for key in simulation.default_config if hasattr(args, key)}
+    return simulation.make_config(*overrides, flags)
+
+
+def run_command(args):
+    config = get_config(args)
+    recorder = None
+    if args.record:
+        from recorder import Recorder
+        recorder = Recorder(args.record, args.stride, args.snapshot_stride)
+    profiler = None
+    if args.profile:
+        from profiling import Profiler
+        profiler = Profiler(None if args.profile == "-" else args.profile, args.profile_interval)
+    start = time.perf_counter()
+    if args.cache:
+        import cache
+
+        result, cached = cache.run_cached(config, cache.ResultCache(args.cache, int(args.cache_size * 2 ** 20)))
+        if cached:
+            print("result read from cache " + args.cache)
+    else:
+        result = simulation.run(config, recorder, args.checkpoint, args.checkpoint_every, profiler)
+    elapsed = time.perf_counter() - start
+    if args.out:
+        simulation.save_result(args.out, result, config)
+    steps = result["steps"]
+    print("scenario %d: %d steps in %.3f s, time %.3e s, reactions %d, temperature %.3e K"
+          % (config["scenario"], steps, elapsed, result["final_time"], result["final_reaction_count"],
+             result["final_temperature"]))
+    if "energy_drift" in result:
+        print("energy drift %.3e" % result["energy_drift"])
+    if profiler is not None:
+        print_profile(profiler.close())
+    if args.plot:
+        if len(result["time"]):
+            plot_observables(args.plot, result)
+        else:
+            print("no steps recorded in this run, nothing to plot")
+
+
+def print_profile(summary):
+    for phase, seconds in sorted(summary["phases"].items(), key=lambda item: -item[1]):
+        print("%-12s %9.3f s %5.1f%%" % (phase, seconds, 100 * summary["shares"][phase]))
+    print(", ".join("%s %d" % item for item in summary["counters"].items()))
+
+
+def sweep_command(args):
+    import sweep
+
+    grid = dict(sweep.parse_grid_argument(argument) for argument in args.grid)
+    configs = sweep.expand_grid(get_config(args), grid, args.sweep_seed)
+
+    def report(row):
+        print("task %s: %d steps in %.3f s, reactions %d" % (row["task"], row["steps"], row["elapsed"],
+                                                             row["reaction_count"]), flush=True)
+
+    skipped, ran, failed = sweep.run_sweep(configs, args.table, args.workers, args.out_dir, report, args.ensemble)
+    for task, error in failed:
+        print("task %s failed: %s" % (task, error))
+    print("%d tasks run, %d already in %s" % (ran, skipped, args.table))
+    if failed:
+        print("%d tasks failed, rerun the sweep to retry them" % len(failed))
+        return 1
+
+
+def bench_command(args):
+    import benchmark
+
+    def report(case):
+        phases = ", ".join("%s %.2f s" % item for item in case["phases"].items())
+        print("%s: %d steps, %.2f steps/s (%s), peak %.1f MB, reactions %d"
+              % (case["name"], case["steps"], case["steps_per_second"], phases, case["peak_memory"] / 2 ** 20,
+                 case["reaction_count"]), flush=True)
+
+    results = benchmark.run_benchmarks(get_config(args), args.steps, args.max_pairs, report)
+    benchmark.save_results(args.out, results)
+    if args.baseline:
+        problems = benchmark.compare_results(results, benchmark.load_results(args.baseline), args.tolerance)
+        for problem in problems:
+            print("REGRESSION " + problem)
+        if problems:
+            return 1
+        print("no regressions against " + args.baseline)
+
+
+def render_command(args):
+    import render
+
+    start = time.perf_counter()
+    frames = render.render_recording(args.recording, args.out, args.fps, args.workers, args.max_points)
+    print("%d frames written to %s in %.1f s" % (frames, args.out, time.perf_counter() - start))
+
+
+# matplotlib is only imported when a plot is requested
+def plot_observables(path, result):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    panels = (("sub_energy", "Sub Energy [ J ]", "blue"), ("temperature", "Temperature [ K ]", "red"),
+              ("pressure", "Pressure [ Pa ]", "green"), ("avg_velocity", "Avg Velocity [m/s]", "purple"))
+    fig, axes = plt.subplots(len(panels), 1, sharex=True, figsize=(6, 8))
+    for ax, (name, label, color) in zip(axes, panels):
+        ax.semilogy(result["time"], result[name], color=color)
+        ax.set_ylabel(label, fontsize=8)
+        ax.grid(True)
+    axes[-1].set_xlabel("Time [ s ]")
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="fusion", description="Headless nuclear fusion chamber simulation")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run one simulation")
+    add_config_arguments(run_parser)
+    run_parser.add_argument("--out", help="write observables and final particle state to this .npz file")
+    run_parser.add_argument("--plot", help="save the observable time series to this image file")
+    run_parser.add_argument("--record", help="stream observables and snapshots to chunk files in this directory, "
+                                             "keeping memory use constant")
+    run_parser.add_argument("--stride", type=int, default=1, help="record observables every STRIDE steps")
+    run_parser.add_argument("--snapshot-stride", dest="snapshot_stride", type=int,
+                            help="record particle positions every SNAPSHOT_STRIDE steps")
+    run_parser.add_argument("--checkpoint", help="checkpoint file, an existing one is resumed")
+    run_parser.add_argument("--checkpoint-every", dest="checkpoint_every", type=int, default=1000,
+                            help="steps between checkpoints [1000]")
+    run_parser.add_argument("--profile", metavar="PATH",
+                            help="time the phases of every step and print a summary; telemetry is appended "
+                                 "to PATH as JSON lines, '-' for the summary only")
+    run_parser.add_argument("--profile-interval", dest="profile_interval", type=int, default=100,
+                            help="steps per telemetry line [100]")
+    run_parser.add_argument("--cache", metavar="DIR",
+                            help="reuse results of identical reproducible runs from DIR, not allowed with --record, "
+                                 "--checkpoint or --profile")
+    run_parser.add_argument("--cache-size", dest="cache_size", type=float, default=1024,
+                            help="cache size limit in MB, least recently used results are evicted [1024]")
+    run_parser.set_defaults(func=run_command)
+
+    sweep_parser = commands.add_parser("sweep", help="run a parameter grid over a process pool")
+    add_config_arguments(sweep_parser)
+    sweep_parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...",
+                              help="config key and the values to sweep, may be repeated")
+    sweep_parser.add_argument("--table", default="sweep.csv", help="results table, rerunning resumes it")
+    sweep_parser.add_argument("--workers", type=int, help="worker processes [all cores]")
+    sweep_parser.add_argument("--out-dir", dest="out_dir", help="also keep the .npz result of every task here")
+    sweep_parser.add_argument("--sweep-seed", dest="sweep_seed", type=int, default=0,
+                              help="root seed the per-task seeds are derived from, for tasks without --seed or a seed grid")
+    sweep_parser.add_argument("--ensemble", action="store_true",
+                              help="step all tasks together as batched arrays in one process, for many small "
+                                   "chambers (global timestep, euler integrator)")
+    sweep_parser.set_defaults(func=sweep_command)
+
+    bench_parser = commands.add_parser("bench", help="time scenarios 1-5 and a scenario 6 scaling curve")
+    add_config_arguments(bench_parser)
+    bench_parser.add_argument("--out", default="bench.json", help="results file")
+    bench_parser.add_argument("--baseline", help="earlier results file to check for regressions")
+    bench_parser.add_argument("--steps", type=int, default=50, help="steps per case, fewer for large cases [50]")
+    bench_parser.add_argument("--max-pairs", dest="max_pairs", type=int, default=10000,
+                              help="largest scenario 6 pair count [10000]")
+    bench_parser.add_argument("--tolerance", type=float, default=0.2,
+                              help="allowed relative drop in steps/s before a case is flagged [0.2]")
+    bench_parser.set_defaults(func=bench_command)
+
+    render_parser = commands.add_parser("render", help="render a recorded run to a GIF or MP4")
+    render_parser.add_argument("recording", help="directory written by run --record with --snapshot-stride")
+    render_parser.add_argument("--out", default="scenario.gif", help="output file, .gif or .mp4")
+    render_parser.add_argument("--fps", type=int, default=30)
+    render_parser.add_argument("--workers", type=int, help="render processes [all cores]")
+    render_parser.add_argument("--max-points", dest="max_points", type=int, default=2000,
+                               help="most points drawn per time series curve")
+    render_parser.set_defaults(func=render_command)
+
+    args = parser.parse_args(argv)
+    if args.command == "run" and args.cache and (args.record or args.profile or args.checkpoint):
+        run_parser.error("--cache keeps only the result, it cannot be combined with --record, --profile or "
+                         "--checkpoint")
+    if args.command == "run" and args.cache:
+        from cache import ResultCache
+        if not ResultCache.is_cacheable(get_config(args)):
+            run_parser.error("--cache needs a seed (--seed or in --config) in scenarios 1 and 6, their random "
+                             "particles differ between unseeded runs")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
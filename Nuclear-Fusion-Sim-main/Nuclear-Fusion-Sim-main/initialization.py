@@ -0,0 +1,58 @@
+import numpy as np
+from scipy import constants as C
+
+from Particles.store import DEUTERON, TRITON, species_mass
+
+# initial particle states sampled for all particles at once from one numpy Generator;
+# the same seed gives the same particles, child streams give independent runs
+
+
+# seed is an int, None for OS entropy, a Generator used as given, or a child stream from spawn_seeds
+def get_generator(seed=None):
+    if isinstance(seed, dict):
+        seed = np.random.SeedSequence(seed["entropy"], spawn_key=tuple(seed["spawn_key"]))
+    return np.random.default_rng(seed)
+
+
+# seeds of count independent child streams of one root seed, as JSON-friendly dicts that can go
+# into a config; get_generator turns each back into its SeedSequence child
+def spawn_seeds(seed, count):
+    return [{"entropy": child.entropy, "spawn_key": list(child.spawn_key)}
+            for child in np.random.SeedSequence(seed).spawn(count)]
+
+
+# uniform positions in the box [0, bounds]
+def get_positions(rng, n, bounds):
+    return rng.uniform(0, 1, (n, 3)) * np.asarray(bounds, dtype=float)
+
+
+# Maxwell-Boltzmann velocities, every component normal with variance kT / m
+def get_maxwell_velocities(rng, mass, temperature):
+    return rng.standard_normal((len(mass), 3)) * np.sqrt(C.k * temperature / np.asarray(mass))[:, None]
+
+
+# velocities of the given speed with isotropic directions
+def get_fixed_speed_velocities(rng, n, speed):
+    direction = rng.standard_normal((n, 3))
+    return direction * (speed / np.linalg.norm(direction, axis=1))[:, None]
+
+
+# temperature at which the mean kinetic energy of a particle of mass m moving at speed is 3/2 kT
+def get_temperature(mass, speed):
+    return mass * speed ** 2 / (3 * C.k)
+
+
+# interleaved deuteron and triton pairs filling the box. velocities="fixed" gives every particle
+# start_speed, "maxwell" samples each species from the Maxwell-Boltzmann distribution with that mean
+# kinetic energy for a deuteron; returns species, positions and velocities for ParticleStore.add_many
+def get_gas(rng, pairs, bounds, start_speed, velocities="fixed"):
+    species = np.tile(np.array([DEUTERON, TRITON], dtype=np.int8), pairs)
+    position = get_positions(rng, 2 * pairs, bounds)
+    if velocities == "fixed":
+        velocity = get_fixed_speed_velocities(rng, 2 * pairs, start_speed)
+    elif velocities == "maxwell":
+        temperature = get_temperature(species_mass[DEUTERON], start_speed)
+        velocity = get_maxwell_velocities(rng, species_mass[species], temperature)
+    else:
+        raise ValueError("unknown velocity distribution: " + velocities)
+    return species, position, velocity
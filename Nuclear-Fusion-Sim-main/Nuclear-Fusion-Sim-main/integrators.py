@@ -0,0 +1,79 @@
+from Particles import particle
+from forces import kick
+
+
+# kick with the forces of the current positions, pick the next dt from the fastest particle, then drift;
+# this is the scheme Chamber has always used
+class Euler:
+    name = "euler"
+
+    def reset(self):
+        pass
+
+    def step(self, chamber):
+        store = chamber.store
+        speed = kick(store.velocity, chamber.get_accelerations(), chamber.dt, particle.max_speed)
+        current_max_v = speed.max() if len(speed) else 0
+        if chamber.scenario > 0 and current_max_v != 0:
+            chamber.set_dt(current_max_v)
+        store.position += store.velocity * chamber.dt
+        chamber.clip_to_bounds()
+        chamber.Time += chamber.dt
+
+
+# kick-drift-kick leapfrog, the accelerations at the end of a step are reused at the start of the next
+class Leapfrog:
+    name = "leapfrog"
+
+    def __init__(self):
+        self.acc = None
+
+    # forget cached accelerations, e.g. after particles changed species
+    def reset(self):
+        self.acc = None
+
+    def set_dt(self, chamber):
+        speed = chamber.store.get_speeds()
+        current_max_v = speed.max() if len(speed) else 0
+        if chamber.scenario > 0 and current_max_v != 0:
+            chamber.set_dt(current_max_v)
+
+    def step(self, chamber):
+        store = chamber.store
+        if self.acc is None:
+            self.acc = chamber.get_accelerations()
+        self.set_dt(chamber)
+        dt = chamber.dt
+        kick(store.velocity, self.acc, dt / 2, particle.max_speed)
+        store.position += store.velocity * dt
+        chamber.clip_to_bounds()
+        self.acc = chamber.get_accelerations()
+        kick(store.velocity, self.acc, dt / 2, particle.max_speed)
+        chamber.Time += dt
+
+
+# velocity-Verlet: positions from velocity and acceleration, velocities from the mean of old and new accelerations
+class VelocityVerlet(Leapfrog):
+    name = "velocity-verlet"
+
+    def step(self, chamber):
+        store = chamber.store
+        if self.acc is None:
+            self.acc = chamber.get_accelerations()
+        self.set_dt(chamber)
+        dt = chamber.dt
+        store.position += store.velocity * dt + self.acc * (dt ** 2 / 2)
+        chamber.clip_to_bounds()
+        acc = chamber.get_accelerations()
+        kick(store.velocity, (self.acc + acc) / 2, dt, particle.max_speed)
+        self.acc = acc
+        chamber.Time += dt
+
+
+integrators = {"euler": Euler, "leapfrog": Leapfrog, "velocity-verlet": VelocityVerlet}
+
+
+def get_integrator(integrator):
+    if isinstance(integrator, str):
+        return integrators[integrator]()
+    return integrator
@@ -0,0 +1,127 @@
+import numpy as np
+from numba import njit, prange
+
+import forces
+from backends import NumpyBackend
+from neighbors import neighbor_offsets
+
+# compiled kernels of the "jit" backend; every loop runs in parallel over particles and keeps
+# per-particle state only, so no N x N temporaries are built. cache=True stores the machine code
+# next to this file, only the first run after a change pays for compilation
+
+
+@njit(parallel=True, cache=True)
+def direct_accelerations(position, charge, mass, targets, force_constant):
+    n = len(position)
+    acc = np.zeros((len(targets), 3))
+    for k in prange(len(targets)):
+        i = targets[k]
+        ax = ay = az = 0.0
+        for j in range(n):
+            dx = position[j, 0] - position[i, 0]
+            dy = position[j, 1] - position[i, 1]
+            dz = position[j, 2] - position[i, 2]
+            dist2 = dx * dx + dy * dy + dz * dz
+            if dist2 > 0:
+                w = charge[j] * dist2 ** -1.5
+                ax += w * dx
+                ay += w * dy
+                az += w * dz
+        a = -force_constant * charge[i] / mass[i]
+        acc[k, 0] = a * ax
+        acc[k, 1] = a * ay
+        acc[k, 2] = a * az
+    return acc
+
+
+# candidates of species b around every particle of species a, in b's key-sorted order
+@njit(cache=True)
+def get_cell_range(cells, i, offset, shape, b_keys):
+    cx = cells[i, 0] + offset[0]
+    cy = cells[i, 1] + offset[1]
+    cz = cells[i, 2] + offset[2]
+    if cx < 0 or cy < 0 or cz < 0 or cx >= shape[0] or cy >= shape[1] or cz >= shape[2]:
+        return 0, 0
+    key = (cx * shape[1] + cy) * shape[2] + cz
+    return np.searchsorted(b_keys, key, side='left'), np.searchsorted(b_keys, key, side='right')
+
+
+# two passes over the a particles: count close pairs, then fill them in at prefix-sum offsets
+@njit(parallel=True, cache=True)
+def close_pairs(position, cells, shape, a, b, b_keys, offsets, max_dist2):
+    count = np.zeros(len(a), dtype=np.int64)
+    for k in prange(len(a)):
+        i = a[k]
+        for o in range(len(offsets)):
+            lo, hi = get_cell_range(cells, i, offsets[o], shape, b_keys)
+            for m in range(lo, hi):
+                j = b[m]
+                dx = position[j, 0] - position[i, 0]
+                dy = position[j, 1] - position[i, 1]
+                dz = position[j, 2] - position[i, 2]
+                if i != j and dx * dx + dy * dy + dz * dz < max_dist2:
+                    count[k] += 1
+    start = np.cumsum(count) - count
+    first = np.empty(count.sum(), dtype=np.int64)
+    second = np.empty_like(first)
+    for k in prange(len(a)):
+        i = a[k]
+        c = start[k]
+        for o in range(len(offsets)):
+            lo, hi = get_cell_range(cells, i, offsets[o], shape, b_keys)
+            for m in range(lo, hi):
+                j = b[m]
+                dx = position[j, 0] - position[i, 0]
+                dy = position[j, 1] - position[i, 1]
+                dz = position[j, 2] - position[i, 2]
+                if i != j and dx * dx + dy * dy + dz * dz < max_dist2:
+                    first[c] = i
+                    second[c] = j
+                    c += 1
+    return first, second
+
+
+@njit(parallel=True, cache=True)
+def reflect(position, velocity, mass, bounds, wall_coeff):
+    damping = np.sqrt(1 - wall_coeff)
+    lost_energy = 0.0
+    bounces = 0
+    for i in prange(len(position)):
+        for axis in range(3):
+            p = position[i, axis]
+            if p < 0 or p > bounds[axis]:
+                v = velocity[i, axis]
+                bounces += 1
+                lost_energy += mass[i] * v * v / 2 * wall_coeff
+                velocity[i, axis] = -v * damping
+                position[i, axis] = 0.0 if p < 0 else bounds[axis]
+    return lost_energy, bounces
+
+
+# exact all-pairs force with the DirectForce interface
+class JitDirectForce:
+    def get_accelerations(self, position, charge, mass, bounds=None, targets=None):
+        if targets is None:
+            targets = np.arange(len(position))
+        return direct_accelerations(position, charge, mass, np.asarray(targets, dtype=np.int64),
+                                    forces.force_constant)
+
+
+class JitBackend(NumpyBackend):
+    name = "jit"
+
+    def get_direct_force(self):
+        return JitDirectForce()
+
+    # the cell list is still binned with numpy, only the pair test over the 27 cells is compiled
+    def get_close_pairs(self, neighbors, position, species, species_a, species_b, max_dist):
+        neighbors.update(position, species)
+        a = neighbors.members.get(species_a)
+        b = neighbors.members.get(species_b)
+        if a is None or b is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return close_pairs(position, neighbors.cells, neighbors.shape, a, b, neighbors.keys[b], neighbor_offsets,
+                           max_dist ** 2)
+
+    def reflect(self, position, velocity, mass, bounds, wall_coeff):
+        return reflect(position, velocity, mass, np.asarray(bounds, dtype=float), wall_coeff)
@@ -0,0 +1,84 @@
+import numpy as np
+
+# offsets to a cell and its 26 neighbours
+neighbor_offsets = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)])
+direct_pairs_limit = 256  # up to this many particles checking all pairs beats the fixed cost of the cell list
+
+
+# all (i, j) with i of species_a, j of species_b and |p_i - p_j| < max_dist, by checking every pair
+def get_direct_pairs(position, species, species_a, species_b, max_dist):
+    a = np.flatnonzero(species == species_a)
+    b = np.flatnonzero(species == species_b)
+    r = position[b][None, :, :] - position[a][:, None, :]
+    i, j = np.nonzero((np.einsum('ijk,ijk->ij', r, r) < max_dist ** 2) & (a[:, None] != b[None, :]))
+    return a[i], b[j]
+
+
+# uniform grid over the chamber box, particles are binned per species so that
+# short-range pair searches only look at the 27 cells around each particle
+class CellList:
+    def __init__(self, cell_size, bounds):
+        self.cell_size = float(cell_size)
+        self.shape = np.maximum(np.ceil(np.asarray(bounds, dtype=float) / self.cell_size), 1).astype(np.int64)
+        self.cells = np.zeros((0, 3), dtype=np.int64)  # cell coordinates of every particle
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.species = np.zeros(0, dtype=np.int8)
+        self.members = dict()  # species -> particle indices sorted by cell key
+        self.moved = 0  # particles that changed cell in the last update
+
+    def get_cells(self, position):
+        cells = np.floor(position / self.cell_size).astype(np.int64)
+        return cells.clip(0, self.shape - 1)
+
+    def get_keys(self, cells):
+        return (cells[:, 0] * self.shape[1] + cells[:, 1]) * self.shape[2] + cells[:, 2]
+
+    # re-bin particles, only species groups with particles that changed cell or species are re-sorted
+    def update(self, position, species):
+        cells = self.get_cells(position)
+        keys = self.get_keys(cells)
+        if len(keys) == len(self.keys):
+            same_species = np.array_equal(species, self.species)
+            changed = (keys != self.keys) | (species != self.species)
+            dirty = np.union1d(species[changed], self.species[changed])
+        else:
+            same_species = False
+            changed = np.ones(len(keys), dtype=bool)
+            dirty = np.union1d(species, np.array(list(self.members), dtype=species.dtype))
+        self.moved = int(np.count_nonzero(changed))
+        self.cells, self.keys, self.species = cells, keys, species.copy()
+        for code in dirty.tolist():
+            if same_species:
+                index = self.members[code]  # previous order is nearly sorted, reuse it
+            else:
+                index = np.flatnonzero(species == code)
+            if len(index):
+                self.members[code] = index[np.argsort(keys[index], kind='stable')]
+            else:
+                self.members.pop(code, None)
+
+    # all (i, j) with i of species_a, j of species_b and |p_i - p_j| < max_dist
+    def get_pairs(self, position, species_a, species_b, max_dist):
+        a = self.members.get(species_a, np.zeros(0, dtype=np.int64))
+        b = self.members.get(species_b, np.zeros(0, dtype=np.int64))
+        if len(a) == 0 or len(b) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        b_keys = self.keys[b]
+        first, second = list(), list()
+        for offset in neighbor_offsets:
+            cells = self.cells[a] + offset
+            inside = np.all((cells >= 0) & (cells < self.shape), axis=1)
+            keys = self.get_keys(cells[inside])
+            lo = np.searchsorted(b_keys, keys, side='left')
+            hi = np.searchsorted(b_keys, keys, side='right')
+            count = hi - lo
+            owner = np.repeat(a[inside], count)
+            start = np.repeat(lo, count)
+            offsets = np.arange(len(owner)) - np.repeat(np.cumsum(count) - count, count)
+            first.append(owner)
+            second.append(b[start + offsets])
+        i = np.concatenate(first)
+        j = np.concatenate(second)
+        r = position[j] - position[i]
+        close = (np.einsum('ij,ij->i', r, r) < max_dist ** 2) & (i != j)
+        return i[close], j[close]
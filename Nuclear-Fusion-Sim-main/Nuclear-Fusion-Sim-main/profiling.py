@@ -0,0 +1,86 @@
+import json
+import time
+
+# phase timers and event counters for the simulation loop. Chamber calls start/stop around every
+# phase and count for events; by default it holds the NullProfiler, whose methods do nothing, so the
+# hooks cost a few no-op calls per step when profiling is off
+
+
+class NullProfiler:
+    enabled = False
+
+    def start(self):
+        return 0.0
+
+    def stop(self, phase, start):
+        pass
+
+    def count(self, counter, value=1):
+        pass
+
+    def end_step(self, chamber):
+        pass
+
+
+null_profiler = NullProfiler()
+
+
+# accumulates wall time per phase and counters; with a path, writes one JSON line with the
+# phase times and counters of the last interval steps, and a summary line on close
+class Profiler:
+    enabled = True
+
+    def __init__(self, path=None, interval=100):
+        self.path = path
+        self.interval = interval
+        self.times = dict()
+        self.calls = dict()
+        self.counters = dict()
+        self.steps = 0
+        self.started = time.perf_counter()
+        self.last_times = dict()
+        self.last_counters = dict()
+        self.file = open(path, "a") if path is not None else None
+
+    def start(self):
+        return time.perf_counter()
+
+    def stop(self, phase, start):
+        self.times[phase] = self.times.get(phase, 0.0) + time.perf_counter() - start
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def count(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def end_step(self, chamber):
+        self.steps += 1
+        if self.file is not None and self.steps % self.interval == 0:
+            self.write({"step": chamber.step_count, "time": chamber.Time, "dt": chamber.dt,
+                        "wall_time": time.perf_counter() - self.started,
+                        "phases": get_difference(self.times, self.last_times),
+                        "counters": get_difference(self.counters, self.last_counters)})
+            self.last_times = dict(self.times)
+            self.last_counters = dict(self.counters)
+
+    def write(self, record):
+        self.file.write(json.dumps(record, default=float) + "\n")
+        self.file.flush()
+
+    # totals since the start, with the share of the wall time spent in every phase
+    def get_summary(self):
+        wall_time = time.perf_counter() - self.started
+        return {"steps": self.steps, "wall_time": wall_time, "phases": dict(self.times), "calls": dict(self.calls),
+                "shares": {phase: t / wall_time for phase, t in self.times.items()} if wall_time > 0 else {},
+                "counters": dict(self.counters)}
+
+    def close(self):
+        summary = self.get_summary()
+        if self.file is not None:
+            self.write({"summary": summary})
+            self.file.close()
+            self.file = None
+        return summary
+
+
+def get_difference(current, last):
+    return {name: value - last.get(name, 0) for name, value in current.items()}
@@ -0,0 +1,145 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+# chamber attributes recorded as per-step observables
+observables = {
+    "time": "Time",
+    "dt": "dt",
+    "temperature": "Temperature",
+    "pressure": "Pressure",
+    "sub_energy": "sub_energy",
+    "avg_velocity": "avg_vel",
+    "reaction_count": "reaction_count",
+    "total_energy_released": "total_energy_released",
+}
+
+
+# streams observables and decimated particle snapshots to append-only npz chunks in a directory,
+# memory use is bounded by chunk_size, snapshot_chunk_size and the ring buffer of the last buffer_size rows
+class Recorder:
+    def __init__(self, path=None, stride=1, snapshot_stride=None, particle_stride=1, chunk_size=1000,
+                 snapshot_chunk_size=50, buffer_size=1000):
+        self.path = path
+        self.stride = stride
+        self.snapshot_stride = snapshot_stride
+        self.particle_stride = particle_stride
+        self.chunk_size = chunk_size
+        self.snapshot_chunk_size = snapshot_chunk_size
+        self.buffer = np.zeros((buffer_size, len(observables)))
+        self.buffered = 0  # rows written to the ring buffer so far
+        self.steps = 0
+        self.rows = list()
+        self.snapshots = list()
+        self.chunks = 0
+        self.snapshot_chunks = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self.chunks = len(glob.glob(os.path.join(path, "observables_*.npz")))
+            self.snapshot_chunks = len(glob.glob(os.path.join(path, "snapshots_*.npz")))
+
+    def write_meta(self, chamber):
+        if self.path is None:
+            return
+        meta = {
+            "observables": list(observables),
+            "stride": self.stride,
+            "snapshot_stride": self.snapshot_stride,
+            "particle_stride": self.particle_stride,
+            "bounds": [chamber.x, chamber.y, chamber.z],
+            "particle_count": len(chamber.store),
+            "particle_pairs": chamber.particle_pairs,
+            "scenario": chamber.scenario,
+            "laser_energy": chamber.laser_energy,
+        }
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    # call once per step
+    def record(self, chamber):
+        if self.steps == 0 and self.chunks == 0 and self.snapshot_chunks == 0:
+            self.write_meta(chamber)
+        self.steps += 1
+        if self.steps % self.stride == 0:
+            row = [getattr(chamber, attribute) for attribute in observables.values()]
+            self.buffer[self.buffered % len(self.buffer)] = row
+            self.buffered += 1
+            if self.path is not None:
+                self.rows.append(row)
+                if len(self.rows) >= self.chunk_size:
+                    self.flush_rows()
+        if self.snapshot_stride and self.path is not None and self.steps % self.snapshot_stride == 0:
+            store = chamber.store
+            self.snapshots.append((chamber.Time, store.position[::self.particle_stride].copy(),
+                                   store.species[::self.particle_stride].copy()))
+            if len(self.snapshots) >= self.snapshot_chunk_size:
+                self.flush_snapshots()
+
+    def flush_rows(self):
+        if not self.rows:
+            return
+        data = np.array(self.rows)
+        np.savez(os.path.join(self.path, "observables_%06d.npz" % self.chunks),
+                 **{name: data[:, k] for k, name in enumerate(observables)})
+        self.chunks += 1
+        self.rows = list()
+
+    def flush_snapshots(self):
+        if not self.snapshots:
+            return
+        time, position, species = zip(*self.snapshots)
+        np.savez(os.path.join(self.path, "snapshots_%06d.npz" % self.snapshot_chunks),
+                 time=np.array(time), position=np.stack(position), species=np.stack(species))
+        self.snapshot_chunks += 1
+        self.snapshots = list()
+
+    def flush(self):
+        if self.path is not None:
+            self.flush_rows()
+            self.flush_snapshots()
+
+    def close(self):
+        self.flush()
+
+    # chunk counters, saved with a checkpoint right after a flush
+    def get_state(self):
+        return {"chunks": self.chunks, "snapshot_chunks": self.snapshot_chunks}
+
+    # drop chunks written after the state was saved, so a resumed run does not record those steps twice
+    def truncate(self, state):
+        for pattern, count in (("observables_*.npz", state["chunks"]), ("snapshots_*.npz", state["snapshot_chunks"])):
+            for chunk in sorted(glob.glob(os.path.join(self.path, pattern)))[count:]:
+                os.remove(chunk)
+        self.chunks = state["chunks"]
+        self.snapshot_chunks = state["snapshot_chunks"]
+
+    # last recorded rows, oldest first, as {observable: array}
+    def get_recent(self):
+        size = len(self.buffer)
+        if self.buffered <= size:
+            data = self.buffer[:self.buffered]
+        else:
+            data = np.roll(self.buffer, -(self.buffered % size), axis=0)
+        return {name: data[:, k].copy() for k, name in enumerate(observables)}
+
+
+def load_meta(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+
+def load_observables(path):
+    chunks = sorted(glob.glob(os.path.join(path, "observables_*.npz")))
+    if not chunks:
+        return {name: np.zeros(0) for name in observables}
+    data = [np.load(chunk) for chunk in chunks]
+    return {name: np.concatenate([chunk[name] for chunk in data]) for name in observables}
+
+
+# yields (time, position, species) snapshot chunks without loading the whole trajectory
+def iter_snapshots(path):
+    for chunk in sorted(glob.glob(os.path.join(path, "snapshots_*.npz"))):
+        with np.load(chunk) as data:
+            yield data["time"], data["position"], data["species"]
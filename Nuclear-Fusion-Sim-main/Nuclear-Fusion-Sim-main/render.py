@@ -0,0 +1,177 @@
+import glob
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import recorder
+from Particles.store import DEUTERON, TRITON, HELION, NEUTRON, species_colors
+
+# time series panels on the right side of the figure, as in run.py
+panels = (("sub_energy", "Sub Energy [ J ] ", "blue"),
+          ("temperature", "Temperature [ K ] ", "red"),
+          ("pressure", "Pressure [ Pa ] ", "green"),
+          ("avg_velocity", "Avg Velocity [m/s]", "purple"))
+
+
+# one figure with a fixed set of artists that are updated in place for every frame,
+# only the animated artists are redrawn on top of a cached background
+class FrameRenderer:
+    def __init__(self, meta, series, max_points=2000, size=7, dpi=100):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        self.meta = meta
+        self.series = series
+        self.max_points = max_points
+        self.fig = fig = plt.figure(figsize=(size, size), dpi=dpi)
+        grid = plt.GridSpec(4, 4, wspace=6, hspace=0.6)
+        at = fig.add_subplot(grid[:2, :2])
+        ax = fig.add_subplot(grid[2:, :2], projection='3d')
+        axes = [fig.add_subplot(grid[row, 2:]) for row in range(4)]
+
+        x, y, z = meta["bounds"]
+        ax.set_xlim([0, x])
+        ax.set_ylim([0, y])
+        ax.set_zlim([0, z])
+        ax.set_xlabel('X axis [m] ', fontsize=8, labelpad=4)
+        ax.set_ylabel('Y axis [m] ', fontsize=8, labelpad=4)
+        ax.set_zlabel('Z axis [m] ', fontsize=8, labelpad=4)
+        for axis in (ax.xaxis, ax.yaxis, ax.zaxis):
+            axis.set_tick_params(labelsize=6)
+
+        self.points = dict()
+        for species in (HELION, DEUTERON, TRITON, NEUTRON):
+            color = species_colors[species]
+            self.points[species], = ax.plot([], [], [], linestyle='None', marker='.', markeredgecolor=color,
+                                            markerfacecolor=color, animated=True)
+
+        time = series["time"]
+        self.lines = dict()
+        for panel, (name, label, color) in zip(axes, panels):
+            values = series[name]
+            positive = values[values > 0]
+            panel.set_yscale('log')
+            if len(time):  # a recording can have snapshots but no observable rows
+                panel.set_xlim(time[0], time[-1] if time[-1] > time[0] else time[0] + 1)
+            if len(positive):
+                panel.set_ylim(positive.min() / 1.5, positive.max() * 1.5)
+            panel.set_ylabel(label, fontsize=8)
+            panel.yaxis.set_label_position("right")
+            panel.grid(True)
+            self.lines[name], = panel.plot([], [], color=color, marker=',', animated=True)
+        axes[-1].set_xlabel('Time [ s ]')
+
+        # labels are part of the static background, only the values are redrawn
+        at.axis("off")
+        labels = ("Particle Number:", "Volume:", "Time:", "Subtracted Energy:", "Total reactions:",
+                  "Total released energy:", "Temperature:", "Pressure:")
+        at.text(0.2, 0.5, "\n".join(labels), transform=at.transAxes, ha='left', va='center', fontsize=8,
+                linespacing=1.4)
+        self.text = at.text(1.3, 0.5, "", transform=at.transAxes, ha='right', va='center', fontsize=8,
+                            linespacing=1.4, animated=True)
+
+        self.artists = list(self.points.values()) + list(self.lines.values()) + [self.text]
+        fig.canvas.draw()
+        self.background = fig.canvas.copy_from_bbox(fig.bbox)
+
+    # observable index of the last row at or before time t, None when no rows were recorded
+    def get_row(self, t):
+        time = self.series["time"]
+        if not len(time):
+            return None
+        return max(int(np.searchsorted(time, t, side='right')) - 1, 0)
+
+    def render(self, t, position, species):
+        row = self.get_row(t)
+        for code, points in self.points.items():
+            selected = position[species == code]
+            points.set_data_3d(selected[:, 0], selected[:, 1], selected[:, 2])
+        count = 0 if row is None else row + 1
+        stride = max(1, count // self.max_points)  # keep drawn history bounded
+        time = self.series["time"][:count:stride]
+        for name, line in self.lines.items():
+            line.set_data(time, self.series[name][:count:stride])
+        self.text.set_text(self.get_text(t, row))
+
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+        return np.asarray(canvas.buffer_rgba())[:, :, :3].copy()
+
+    def get_text(self, t, row):
+        series = self.series
+        x, y, z = self.meta["bounds"]
+        if row is None:
+            values = ("-",) * 5
+        else:
+            values = ("%.3e [J]" % series["sub_energy"][row],
+                      "%d" % series["reaction_count"][row],
+                      "%.2f [MeV]" % series["total_energy_released"][row],
+                      "%.3e [K]" % series["temperature"][row],
+                      "%.3e [Pa]" % series["pressure"][row])
+        return "\n".join(("%d" % self.meta["particle_count"],
+                          "%.2e [m3]" % (x * y * z),
+                          "%.3e [s]" % t) + values)
+
+
+def get_snapshot_files(path):
+    return sorted(glob.glob(os.path.join(path, "snapshots_*.npz")))
+
+
+renderer = None  # per worker process, built on first use
+
+
+# worker entry point, renders every frame of one snapshot chunk file; GIF frames are
+# palette-quantized here so that the serial writer's own quantization has at most 256 colors to map
+def render_chunk(path, snapshot_file, max_points, gif=False):
+    global renderer
+    if renderer is None or renderer.meta["path"] != path:
+        meta = recorder.load_meta(path)
+        meta["path"] = path
+        renderer = FrameRenderer(meta, recorder.load_observables(path), max_points)
+    with np.load(snapshot_file) as data:
+        frames = [renderer.render(t, position, species)
+                  for t, position, species in zip(data["time"], data["position"], data["species"])]
+    if gif:
+        from PIL import Image
+        frames = [np.asarray(Image.fromarray(frame).quantize(method=Image.Quantize.FASTOCTREE).convert("RGB"))
+                  for frame in frames]
+    return frames
+
+
+# frames in order, chunks are rendered in worker processes with at most 2 chunks per worker in flight
+def iter_frames(path, workers=None, max_points=2000, gif=False):
+    files = get_snapshot_files(path)
+    if not files:
+        raise ValueError("no particle snapshots in " + path + ", record with a snapshot stride")
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for snapshot_file in files:
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+            pending.append(pool.submit(render_chunk, path, snapshot_file, max_points, gif))
+        while pending:
+            yield from pending.popleft().result()
+
+
+# render a recording to a GIF or to any video format imageio can write (e.g. MP4), frames are
+# encoded and written to the file one at a time as they arrive
+def render_recording(path, out, fps=30, workers=None, max_points=2000):
+    import imageio
+
+    gif = out.lower().endswith(".gif")
+    # imageio's default pillow plugin keeps every GIF frame until it is closed, its legacy GIF-PIL
+    # format writes them one at a time; it quantizes every frame again, fast octree (2) keeps the colors
+    # of the worker's palette
+    options = dict(format="GIF-PIL", quantizer=2, loop=0) if gif else dict()
+    count = 0
+    with imageio.get_writer(out, fps=fps, **options) as writer:
+        for frame in iter_frames(path, workers, max_points, gif):
+            writer.append_data(frame)
+            count += 1
+    return count
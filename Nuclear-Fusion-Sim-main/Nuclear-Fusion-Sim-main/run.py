@@ -1,20 +1,18 @@
-from Particles.helion import Helion
-from Particles.triton import Triton
-from Particles.neutron import Neutron
-from Particles.deuteron import Deuteron
+from Particles.store import DEUTERON, TRITON, HELION, NEUTRON, species_colors
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from chamber import Chamber
 from laser import Laser
+from profiling import Profiler
 from matplotlib.widgets import Slider
-import random
 from matplotlib.offsetbox import AnchoredText
 from matplotlib.animation import PillowWriter
 import imageio
 
-random.seed(0)
+seed = 0
 laser = Laser()
+profiler = Profiler()  # phase times of the simulation and of the plotting below
 matplotlib.use('Qt5Agg')
 
 print('''\nSimulation scenarios:
@@ -27,7 +25,7 @@ print('''\nSimulation scenarios:
 ''')
 scenario = int(input("Choose scenario: ") or "1")
 
-chamber = Chamber(laser, scenario=scenario)
+chamber = Chamber(laser, scenario=scenario, seed=seed, profiler=profiler)
 stop_time = float(input("Stop Time: ") or "1e-7")
 
 if scenario == 6:
@@ -36,7 +34,8 @@ if scenario == 6:
     intensity = float(input("Laser intensity [5e17 W/m^2]: ") or "5e17")
     activation_time = int(input("Laser activation time [1 s]: ") or "1")
     laser = Laser(wavelength, intensity, activation_time)
-    chamber = Chamber(laser, scenario=scenario, particle_pairs=particle_pairs)
+    chamber = Chamber(laser, scenario=scenario, particle_pairs=particle_pairs, seed=seed,
+                      profiler=profiler)
 
 chamber.create_particles()
 
@@ -101,32 +100,25 @@ lines, x, y, z, helionx, heliony, helionz, \
 deuteronx, deuterony, deuteronz, tritonx, tritony, tritonz, \
 neutronx, neutrony, neutronz, Time, Velocity, \
 Temperature, SubEnergy, ReactionCount, TotalEnergy, Pressure, title = ([] for i in range(24))
-helion_color = Helion().get_color()
-neutron_color = Neutron().get_color()
-triton_color = Triton().get_color()
-deuteron_color = Deuteron().get_color()
+helion_color = species_colors[HELION]
+neutron_color = species_colors[NEUTRON]
+triton_color = species_colors[TRITON]
+deuteron_color = species_colors[DEUTERON]
 laserEnergy = chamber.laser_energy
 Dt = chamber.dt
 
 while True:
     chamber.update_particles()
-    for p in chamber.particles:
-        if isinstance(p, Helion):
-            helionx.append(p.position.x)
-            heliony.append(p.position.y)
-            helionz.append(p.position.z)
-        elif isinstance(p, Deuteron):
-            deuteronx.append(p.position.x)
-            deuterony.append(p.position.y)
-            deuteronz.append(p.position.z)
-        elif isinstance(p, Triton):
-            tritonx.append(p.position.x)
-            tritony.append(p.position.y)
-            tritonz.append(p.position.z)
-        else:
-            neutronx.append(p.position.x)
-            neutrony.append(p.position.y)
-            neutronz.append(p.position.z)
+    plot_start = profiler.start()
+    store = chamber.store
+    for species, px, py, pz in ((HELION, helionx, heliony, helionz),
+                                (DEUTERON, deuteronx, deuterony, deuteronz),
+                                (TRITON, tritonx, tritony, tritonz),
+                                (NEUTRON, neutronx, neutrony, neutronz)):
+        position = store.position[store.species == species]
+        px.extend(position[:, 0])
+        py.extend(position[:, 1])
+        pz.extend(position[:, 2])
 
     Time.append(chamber.Time)
     SubEnergy.append(chamber.sub_energy)
@@ -168,12 +160,16 @@ while True:
     lines.append([lineh, lined, linet, linen, title, line2, line3, line4, line5])
     x.clear(), y.clear(), z.clear(), helionx.clear(), heliony.clear(), helionz.clear(), deuteronx.clear(), deuterony.clear(), deuteronz.clear()
     tritonx.clear(), tritony.clear(), tritonz.clear(), neutronx.clear(), neutrony.clear(), neutronz.clear()
+    profiler.stop("plotting", plot_start)
     # if chamber.Time <= stop_time:
     if chamber.Time <= stop_time:
         continue
     else:
         break
 
+summary = profiler.close()
+print("\n".join("%-12s %9.3f s" % item for item in summary["phases"].items()))
+
 # file_name = "scenario" + str(scenario)
 # file_name = "./" + file_name + '.gif'
 ani = animation.ArtistAnimation(fig, lines, interval=10, blit=True)
@@ -0,0 +1,179 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import forces
+from backends import get_backend
+
+# exact all-pairs force split by rows over worker processes. Particle arrays live in shared memory
+# that every worker maps once, each step the main process copies positions in (charges and masses
+# only when the species changed), tells every worker to go over its pipe, computes its own slice of
+# the targets and waits for the workers to report back; no particle data is pickled per step
+
+# layout of the shared blocks, arrays of capacity rows
+shared_arrays = (("position", 3, np.float64), ("charge", 0, np.float64), ("mass", 0, np.float64),
+                 ("targets", 0, np.int64), ("acc", 3, np.float64))
+header_size = 3  # particle count, target count, force constant
+
+
+def get_views(blocks, capacity):
+    header = np.ndarray(header_size, dtype=np.float64, buffer=blocks[0].buf)
+    arrays = dict()
+    for block, (name, width, dtype) in zip(blocks[1:], shared_arrays):
+        shape = (capacity, width) if width else (capacity,)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return header, arrays
+
+
+# rows [lo, hi) of the targets handled by process rank out of parties
+def get_slice(n_targets, rank, parties):
+    bounds = np.linspace(0, n_targets, parties + 1).astype(int)
+    return bounds[rank], bounds[rank + 1]
+
+
+def compute_slice(force, header, arrays, rank, parties):
+    n, n_targets = int(header[0]), int(header[1])
+    lo, hi = get_slice(n_targets, rank, parties)
+    if hi > lo:
+        arrays["acc"][lo:hi] = force.get_accelerations(arrays["position"][:n], arrays["charge"][:n],
+                                                       arrays["mass"][:n], None, arrays["targets"][lo:hi])
+
+
+# worker entry point, one call per process for the whole run; the main process sends True for
+# every step and False to stop, and the worker answers once its slice is written. main_connection
+# is the main process end of the pipe, closed here so that the worker sees EOF when the main
+# process dies (workers started later close theirs in turn when they exit)
+def work(names, capacity, rank, parties, connection, main_connection, backend):
+    main_connection.close()
+    if backend == "jit":
+        import numba
+        numba.set_num_threads(1)  # the processes already use every core
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    header, arrays = get_views(blocks, capacity)
+    force = get_backend(backend).get_direct_force()
+    try:
+        while connection.recv():
+            forces.force_constant = float(header[2])
+            compute_slice(force, header, arrays, rank, parties)
+            connection.send(True)
+    except EOFError:
+        pass  # the main process is gone
+    finally:
+        del header, arrays
+        for block in blocks:
+            block.close()
+
+
+def shutdown(processes, connections, blocks):
+    for connection in connections:
+        try:
+            connection.send(False)
+        except OSError:
+            pass  # that worker already exited
+        connection.close()
+    for process in processes:
+        process.join()
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+# timeout is how long the main process waits for the workers to finish their slices after its own
+# before the run fails; a worker that dies fails the run right away
+class SharedDirectForce:
+    def __init__(self, workers=None, backend="numpy", timeout=60):
+        self.workers = workers or os.cpu_count()
+        self.backend = backend
+        self.timeout = timeout
+        self.force = get_backend(backend).get_direct_force()
+        self.capacity = 0
+        self.processes = list()
+        self.connections = list()
+        self.sources = None  # charge and mass arrays last copied into shared memory
+        self.finalizer = None
+
+    # allocate shared blocks for at least n particles and start the workers, once per run
+    # unless the particle count outgrows the blocks
+    def start(self, n):
+        self.close()
+        self.capacity = capacity = max(n, 1)
+        sizes = [header_size * 8] + [capacity * max(width, 1) * np.dtype(dtype).itemsize
+                                     for _, width, dtype in shared_arrays]
+        blocks = [shared_memory.SharedMemory(create=True, size=size) for size in sizes]
+        self.header, self.arrays = get_views(blocks, capacity)
+        self.header[:] = 0
+        self.sources = None
+        names = [block.name for block in blocks]
+        self.processes, self.connections = list(), list()
+        for rank in range(1, self.workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=work, daemon=True,
+                                              args=(names, capacity, rank, self.workers, worker_connection,
+                                                    connection, self.backend))
+            process.start()
+            worker_connection.close()
+            self.processes.append(process)
+            self.connections.append(connection)
+        self.finalizer = weakref.finalize(self, shutdown, self.processes, self.connections, blocks)
+
+    def close(self):
+        if self.finalizer is not None:
+            self.header = self.arrays = None
+            self.finalizer()
+            self.finalizer = None
+            self.processes, self.connections = list(), list()
+
+    # wait until every worker reported its slice, failing if one of them died or the timeout passed
+    def wait(self):
+        sentinels = {process.sentinel: process for process in self.processes}
+        waiting = list(self.connections)
+        while waiting:
+            ready = multiprocessing.connection.wait(waiting + list(sentinels), self.timeout)
+            dead = [sentinels[item] for item in ready if item in sentinels]
+            if dead:
+                self.fail("%d force worker(s) exited (exit codes %s)"
+                          % (len(dead), ", ".join(str(process.exitcode) for process in dead)))
+            if not ready:
+                self.fail("force workers did not finish their slices within %s s" % self.timeout)
+            for connection in ready:
+                connection.recv()
+                waiting.remove(connection)
+
+    def fail(self, message):
+        for process in self.processes:
+            process.kill()
+        self.close()
+        raise RuntimeError(message)
+
+    def get_accelerations(self, position, charge, mass, bounds=None, targets=None):
+        if self.workers == 1:
+            return self.force.get_accelerations(position, charge, mass, bounds, targets)
+        n = len(position)
+        if targets is None:
+            targets = np.arange(n)
+        if n > self.capacity or self.finalizer is None:
+            self.start(n)
+        arrays, header = self.arrays, self.header
+        arrays["position"][:n] = position
+        # ParticleStore replaces its charge and mass arrays when species change, so the same arrays
+        # as last time hold the same values
+        if self.sources is None or self.sources[0] is not charge or self.sources[1] is not mass:
+            arrays["charge"][:n] = charge
+            arrays["mass"][:n] = mass
+            self.sources = (charge, mass)
+        arrays["targets"][:len(targets)] = targets
+        header[:] = n, len(targets), forces.force_constant
+        for connection in self.connections:
+            try:
+                connection.send(True)
+            except OSError:
+                pass  # a dead worker is reported by wait
+        try:
+            compute_slice(self.force, header, arrays, 0, self.workers)
+        finally:
+            self.wait()  # also after an error here, so that no answer is left over for the next step
+        return arrays["acc"][:len(targets)].copy()
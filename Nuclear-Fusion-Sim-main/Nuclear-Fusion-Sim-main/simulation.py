@@ -0,0 +1,179 @@
+import json
+import os
+
+import numpy as np
+
+from chamber import Chamber
+from checkpoint import load_checkpoint, load_recorder_state, save_checkpoint
+from forces import BarnesHutForce
+from integrators import integrators
+from shared_force import SharedDirectForce
+from laser import Laser
+from recorder import observables
+
+# run parameters, laser and chamber values default to the ones used by Laser and Chamber
+default_config = {
+    "scenario": 1,
+    "particle_pairs": 5,
+    "stop_time": 1e-7,  # [s]
+    "wavelength": 3.51e-8,  # [m]
+    "intensity": 5e18,  # [W/m^2]
+    "activation_time": 1,  # [s]
+    "force_solver": "direct",  # "direct", "barnes-hut" or "shared" (direct split over processes)
+    "force_workers": None,  # processes of the shared solver, None for all cores
+    "theta": 0.5,  # opening angle, barnes-hut solver only
+    "timestep": "global",  # "global" or "block" (hierarchical per-particle steps)
+    "integrator": "euler",  # "euler", "leapfrog" or "velocity-verlet", global timestep only
+    "backend": "numpy",  # "python", "numpy" or "jit" kernels for the direct force, fusion and walls
+    "observable_intervals": None,  # {metric: steps} overrides of diagnostics.default_intervals
+    "energy_diagnostic": False,  # report the relative total energy drift of the run
+    "velocities": "fixed",  # initial speeds in scenarios 1 and 6, "fixed" or "maxwell"
+    "max_steps": None,
+    "seed": None,  # initial particle positions and velocities, None for OS entropy
+}
+
+def load_config(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# complete config from defaults, unknown keys are rejected so typos do not pass silently
+def make_config(*overrides):
+    config = dict(default_config)
+    for override in overrides:
+        for key, value in override.items():
+            if key not in default_config:
+                raise KeyError("unknown config key: " + key)
+            if value is not None:
+                config[key] = value
+    return config
+
+
+# allowed values of the config keys that select an implementation
+config_choices = {"force_solver": ("direct", "barnes-hut", "shared"), "timestep": ("global", "block"),
+                  "integrator": tuple(integrators), "backend": ("python", "numpy", "jit"),
+                  "velocities": ("fixed", "maxwell")}
+
+
+# raise ValueError for config values a run would only fail on once it is under way
+def check_config(config):
+    for key, choices in config_choices.items():
+        if config[key] not in choices:
+            raise ValueError("%s must be one of %s, got %r" % (key, ", ".join(choices), config[key]))
+    if config["scenario"] not in range(1, 7):
+        raise ValueError("scenario must be 1 to 6, got %r" % config["scenario"])
+    if config["timestep"] == "block" and config["integrator"] != "euler":
+        raise ValueError("block timesteps need the euler integrator, got " + config["integrator"])
+    for key in ("particle_pairs", "max_steps"):
+        value = config[key]
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise ValueError("%s must be a non-negative integer, got %r" % (key, value))
+
+
+def build_laser(config):
+    return Laser(config["wavelength"], config["intensity"], config["activation_time"])
+
+
+def build_force_solver(config):
+    if config["force_solver"] == "barnes-hut":
+        return BarnesHutForce(config["theta"])
+    if config["force_solver"] == "shared":
+        return SharedDirectForce(config["force_workers"], config["backend"])
+    return config["force_solver"]  # "direct" is provided by the chamber backend
+
+
+def build_chamber(config):
+    chamber = Chamber(build_laser(config), scenario=config["scenario"], particle_pairs=config["particle_pairs"],
+                      force_solver=build_force_solver(config), seed=config["seed"], timestep=config["timestep"],
+                      integrator=config["integrator"], backend=config["backend"],
+                      observable_intervals=config["observable_intervals"], velocities=config["velocities"])
+    chamber.create_particles()
+    return chamber
+
+
+# step the chamber until stop_time is passed or it has made max_steps steps in total,
+# callback(chamber) runs after every step
+def run_simulation(chamber, stop_time, max_steps=None, callback=None):
+    steps = 0
+    while chamber.Time <= stop_time and (max_steps is None or chamber.step_count < max_steps):
+        chamber.update_particles()
+        steps += 1
+        if callback is not None:
+            callback(chamber)
+    return steps
+
+
+# run one configuration; with a recorder observables are streamed to it and only its
+# ring buffer is returned, otherwise the full time series is kept in memory.
+# With a checkpoint path the run resumes from it when it exists and writes it every
+# checkpoint_every steps and at the end. A profiler times the phases of every step
+def run(config, recorder=None, checkpoint_path=None, checkpoint_every=None, profiler=None):
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        chamber = load_checkpoint(checkpoint_path, build_force_solver(config), config["backend"])
+        recorder_state = load_recorder_state(checkpoint_path)
+        if recorder is not None and recorder.path is not None and recorder_state is not None:
+            recorder.truncate(recorder_state)
+    else:
+        chamber = build_chamber(config)
+        if checkpoint_path is not None and recorder is not None and recorder.path is not None:
+            # no checkpoint yet, chunks of an earlier attempt that died before its first one are stale
+            recorder.truncate({"chunks": 0, "snapshot_chunks": 0})
+    if profiler is not None:
+        chamber.profiler = profiler
+    if config["energy_diagnostic"]:
+        chamber.get_energy_drift()  # sets the reference energy unless resumed
+    if recorder is None:
+        history = {name: list() for name in observables}
+
+        def record(chamber):
+            for name, attribute in observables.items():
+                history[name].append(getattr(chamber, attribute))
+    else:
+        recorder.steps = chamber.step_count
+        record = recorder.record
+
+    def step_done(chamber):
+        record(chamber)
+        if checkpoint_every and chamber.step_count % checkpoint_every == 0:
+            write_checkpoint(chamber)
+
+    def write_checkpoint(chamber):
+        if recorder is not None:
+            recorder.flush()
+        save_checkpoint(checkpoint_path, chamber, recorder)
+
+    run_simulation(chamber, config["stop_time"], config["max_steps"],
+                   step_done if checkpoint_path is not None else record)
+    if checkpoint_path is not None:
+        write_checkpoint(chamber)
+    if hasattr(chamber.force, "close"):
+        chamber.force.close()  # stop worker processes of the shared solver
+    if recorder is None:
+        result = {name: np.array(values) for name, values in history.items()}
+    else:
+        recorder.close()
+        result = recorder.get_recent()
+    result["steps"] = chamber.step_count
+    if config["energy_diagnostic"]:
+        result["energy_drift"] = chamber.get_energy_drift()
+    result.update(chamber.diagnostics.get_summary())
+    result.update(get_final_state(chamber))
+    return result
+
+
+def get_final_state(chamber):
+    store = chamber.store
+    state = {
+        "position": store.position.copy(),
+        "velocity": store.velocity.copy(),
+        "species": store.species.copy(),
+        "bounds": np.array([chamber.x, chamber.y, chamber.z]),
+    }
+    # end values of the observables, also when no step was recorded (stride, resumed finished run, max_steps 0)
+    for name, attribute in observables.items():
+        state["final_" + name] = getattr(chamber, attribute)
+    return state
+
+
+def save_result(path, result, config):
+    np.savez_compressed(path, config=json.dumps(config), **result)
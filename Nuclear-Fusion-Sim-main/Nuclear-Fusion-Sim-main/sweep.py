@@ -0,0 +1,140 @@
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import simulation
+from initialization import spawn_seeds
+
+# final values of these observables go into the sweep table
+summary_observables = ("time", "reaction_count", "total_energy_released", "temperature", "pressure", "sub_energy",
+                       "avg_velocity")
+table_columns = ("task",) + tuple(simulation.default_config) + ("steps", "elapsed") + summary_observables
+
+
+# every combination of the grid values on top of the base config; tasks without a seed (from the
+# base config or the grid) get the child stream of seed at their position in the grid, so an
+# unchanged sweep reproduces its seeds
+def expand_grid(base_config, grid, seed=0):
+    names = list(grid)
+    combinations = list(itertools.product(*(grid[name] for name in names)))
+    seeds = spawn_seeds(seed, len(combinations))
+    configs = list()
+    for values, task_seed in zip(combinations, seeds):
+        config = simulation.make_config(base_config, dict(zip(names, values)))
+        if config["seed"] is None:
+            config["seed"] = task_seed
+        configs.append(config)
+    return configs
+
+
+def get_task_key(config):
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+# worker entry point, runs one simulation and returns its table row
+def run_task(config, out_dir=None):
+    start = time.perf_counter()
+    result = simulation.run(config)
+    row = get_row(config, result, time.perf_counter() - start)
+    if out_dir is not None:
+        simulation.save_result(os.path.join(out_dir, row["task"] + ".npz"), result, config)
+    return row
+
+
+def read_table(path):
+    if not os.path.exists(path):
+        return list()
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def get_row(config, result, elapsed):
+    row = {"task": get_task_key(config), "steps": int(result["steps"]), "elapsed": elapsed}
+    row.update({key: json.dumps(value) if isinstance(value, (dict, list)) else value for key, value in config.items()})
+    for name in summary_observables:
+        row[name] = np.asarray(result["final_" + name]).item()
+    return row
+
+
+# all tasks as one batched ensemble run in this process, elapsed is the per-task share of the total
+def run_ensemble_tasks(configs, out_dir=None):
+    import ensemble
+
+    start = time.perf_counter()
+    results = ensemble.run_ensemble(configs)
+    elapsed = (time.perf_counter() - start) / max(len(configs), 1)
+    rows = list()
+    for config, result in zip(configs, results):
+        row = get_row(config, result, elapsed)
+        if out_dir is not None:
+            simulation.save_result(os.path.join(out_dir, row["task"] + ".npz"), result, config)
+        rows.append(row)
+    return rows
+
+
+# run all tasks not yet in the table, appending rows as tasks finish so an interrupted sweep can resume;
+# with ensemble=True the pending tasks are stepped together as one batched ensemble instead. Configs are
+# checked before anything runs, a task that fails while running gets no row and the others go on.
+# Returns the number of tasks skipped and run, and a list of (task, error) for the failed ones
+def run_sweep(configs, table_path, workers=None, out_dir=None, callback=None, ensemble=False):
+    for config in configs:
+        try:
+            simulation.check_config(config)
+        except ValueError as error:
+            raise ValueError("task %s: %s" % (get_task_key(config), error)) from None
+    done = {row["task"] for row in read_table(table_path)}
+    pending = [config for config in configs if get_task_key(config) not in done]
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    new_table = not os.path.exists(table_path) or os.path.getsize(table_path) == 0
+    failed = list()
+    with open(table_path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=table_columns)
+        if new_table:
+            writer.writeheader()
+            f.flush()
+
+        def write_row(row):
+            writer.writerow(row)
+            f.flush()
+            if callback is not None:
+                callback(row)
+
+        if ensemble:
+            for row in run_ensemble_tasks(pending, out_dir):
+                write_row(row)
+        else:
+            # forkserver workers do not inherit threads of this process (numba's pool), a forked copy of
+            # those can hang the worker on exit
+            context = multiprocessing.get_context("forkserver")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {pool.submit(run_task, config, out_dir): get_task_key(config) for config in pending}
+                for future in as_completed(futures):
+                    try:
+                        row = future.result()
+                    except Exception as error:
+                        failed.append((futures[future], "%s: %s" % (type(error).__name__, error)))
+                        continue
+                    write_row(row)
+    return len(configs) - len(pending), len(pending) - len(failed), failed
+
+
+# "name=v1,v2,..." grid argument, values are parsed as JSON where possible
+def parse_grid_argument(argument):
+    name, _, values = argument.partition("=")
+    if name not in simulation.default_config or not values:
+        raise ValueError("grid argument must look like name=v1,v2 with a config key, got: " + argument)
+    parsed = list()
+    for value in values.split(","):
+        try:
+            parsed.append(json.loads(value))
+        except json.JSONDecodeError:
+            parsed.append(value)
+    return name, parsed
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import simulation
+from backends import get_backend
+from neighbors import CellList
+from Particles.store import DEUTERON, TRITON
+
+backend_names = ("python", "numpy", "jit")
+
+
+@pytest.fixture(params=backend_names)
+def backend(request):
+    if request.param == "jit":
+        pytest.importorskip("numba")
+    return get_backend(request.param)
+
+
+def get_gas(n, seed=0):
+    rng = np.random.default_rng(seed)
+    species = np.tile(np.array([DEUTERON, TRITON], dtype=np.int8), n // 2)
+    return rng.uniform(0, 1, (n, 3)), rng.normal(0, 1, (n, 3)), species, rng.uniform(1, 2, n)
+
+
+def test_direct_force(backend):
+    position, _, species, mass = get_gas(60)
+    charge = np.where(species == DEUTERON, 1.0, -1.0)
+    expected = get_backend("python").get_direct_force().get_accelerations(position, charge, mass)
+    np.testing.assert_allclose(backend.get_direct_force().get_accelerations(position, charge, mass), expected,
+                               rtol=1e-10)
+
+
+# small and large particle counts, the numpy backend checks all pairs directly below a size limit
+@pytest.mark.parametrize("n", [20, 600])
+def test_close_pairs(backend, n):
+    position, _, species, _ = get_gas(n)
+    max_dist = 0.08
+    d, t = backend.get_close_pairs(CellList(max_dist, (1, 1, 1)), position, species, DEUTERON, TRITON, max_dist)
+    r = position[None, :, :] - position[:, None, :]
+    close = (np.einsum('ijk,ijk->ij', r, r) < max_dist ** 2) & (species[:, None] == DEUTERON) \
+        & (species[None, :] == TRITON)
+    assert sorted(zip(d.tolist(), t.tolist())) == sorted(zip(*np.nonzero(close)))
+
+
+def test_reflect(backend):
+    position, velocity, _, mass = get_gas(50)
+    position = position * 1.4 - 0.2  # some particles outside the box on every side
+    expected = [position.copy(), velocity.copy()]
+    expected_result = get_backend("python").reflect(*expected, mass, (1, 1, 1), 0.3)
+    lost_energy, bounces = backend.reflect(position, velocity, mass, (1, 1, 1), 0.3)
+    assert bounces == expected_result[1] > 0
+    assert lost_energy == pytest.approx(expected_result[0], rel=1e-12)
+    np.testing.assert_allclose(position, expected[0], rtol=1e-12)
+    np.testing.assert_allclose(velocity, expected[1], rtol=1e-12)
+
+
+# whole runs with reactions end in the same state on every backend
+def test_runs_match():
+    results = dict()
+    for name in backend_names:
+        if name == "jit":
+            pytest.importorskip("numba")
+        config = simulation.make_config({"scenario": 1, "seed": 1, "max_steps": 300, "backend": name})
+        results[name] = simulation.run(config)
+    reference = results["python"]
+    assert reference["final_reaction_count"] > 0
+    for result in results.values():
+        assert result["final_reaction_count"] == reference["final_reaction_count"]
+        np.testing.assert_array_equal(result["species"], reference["species"])
+        np.testing.assert_allclose(result["velocity"], reference["velocity"], rtol=1e-8)
+        np.testing.assert_allclose(result["temperature"], reference["temperature"], rtol=1e-8)
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+import cache
+import simulation
+
+
+# scenarios 2-5 draw no random numbers and are cached without a seed, the random gas of 1 and 6 needs one
+@pytest.mark.parametrize("scenario, seed, cacheable", [(2, None, True), (5, None, True), (1, None, False),
+                                                       (6, None, False), (1, 7, True), (6, 7, True)])
+def test_cacheable_runs(tmp_path, scenario, seed, cacheable):
+    config = simulation.make_config({"scenario": scenario, "seed": seed, "particle_pairs": 3, "max_steps": 10})
+    results = cache.ResultCache(str(tmp_path))
+    first, cached = cache.run_cached(config, results)
+    assert not cached
+    second, cached = cache.run_cached(config, results)
+    assert cached == cacheable
+    if cacheable:
+        np.testing.assert_array_equal(second["position"], first["position"])
@@ -0,0 +1,75 @@
+import numpy as np
+
+import recorder
+import simulation
+
+
+# stops the run at a given step, as if the process had been killed
+class Crash(recorder.Recorder):
+    def __init__(self, path, crash_step, **kwargs):
+        super().__init__(path, **kwargs)
+        self.crash_step = crash_step
+
+    def record(self, chamber):
+        if chamber.step_count == self.crash_step:
+            raise KeyboardInterrupt
+        super().record(chamber)
+
+
+def get_config(**overrides):
+    return simulation.make_config({"scenario": 1, "seed": 1, "max_steps": 300, "stop_time": 1}, overrides)
+
+
+def assert_same_state(result, expected):
+    for name in ("position", "velocity", "species", "final_time", "final_reaction_count", "final_temperature",
+                 "final_sub_energy"):
+        np.testing.assert_array_equal(result[name], expected[name])
+
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    expected = simulation.run(get_config())
+    path = str(tmp_path / "run.ckpt")
+    simulation.run(get_config(max_steps=120), checkpoint_path=path, checkpoint_every=50)
+    result = simulation.run(get_config(), checkpoint_path=path, checkpoint_every=50)
+    assert expected["final_reaction_count"] > 0
+    assert result["steps"] == expected["steps"]
+    assert_same_state(result, expected)
+
+
+# a run killed between checkpoints resumes from the last one, and its recording has every step once
+def test_resume_after_crash_records_every_step_once(tmp_path):
+    kwargs = {"snapshot_stride": 10, "chunk_size": 40, "snapshot_chunk_size": 3}
+    path = str(tmp_path / "run.ckpt")
+    try:
+        simulation.run(get_config(), Crash(str(tmp_path / "crashed"), 250, **kwargs), path, 100)
+    except KeyboardInterrupt:
+        pass
+    result = simulation.run(get_config(), recorder.Recorder(str(tmp_path / "crashed"), **kwargs), path, 100)
+    expected = simulation.run(get_config(), recorder.Recorder(str(tmp_path / "full"), **kwargs))
+    assert_same_state(result, expected)
+    observables = recorder.load_observables(str(tmp_path / "crashed"))
+    expected_observables = recorder.load_observables(str(tmp_path / "full"))
+    assert len(observables["time"]) == 300
+    for name in expected_observables:
+        np.testing.assert_array_equal(observables[name], expected_observables[name])
+    times = [time for time, _, _ in recorder.iter_snapshots(str(tmp_path / "crashed"))]
+    expected_times = [time for time, _, _ in recorder.iter_snapshots(str(tmp_path / "full"))]
+    np.testing.assert_array_equal(np.concatenate(times), np.concatenate(expected_times))
+
+
+# a run killed before its first checkpoint starts over, its rerun replaces the old recording
+def test_rerun_after_crash_before_first_checkpoint(tmp_path):
+    kwargs = {"chunk_size": 40, "snapshot_stride": 10, "snapshot_chunk_size": 3}
+    path = str(tmp_path / "run.ckpt")
+    try:
+        simulation.run(get_config(), Crash(str(tmp_path / "crashed"), 250, **kwargs), path, 1000)
+    except KeyboardInterrupt:
+        pass
+    result = simulation.run(get_config(), recorder.Recorder(str(tmp_path / "crashed"), **kwargs), path, 1000)
+    expected = simulation.run(get_config(), recorder.Recorder(str(tmp_path / "full"), **kwargs))
+    assert_same_state(result, expected)
+    observables = recorder.load_observables(str(tmp_path / "crashed"))
+    assert len(observables["time"]) == 300
+    np.testing.assert_array_equal(observables["time"], recorder.load_observables(str(tmp_path / "full"))["time"])
+    times = np.concatenate([time for time, _, _ in recorder.iter_snapshots(str(tmp_path / "crashed"))])
+    assert len(times) == 30
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import ensemble
+import forces
+import simulation
+
+
+def get_configs():
+    return [simulation.make_config({"scenario": scenario, "seed": seed, "max_steps": 300})
+            for seed in range(4) for scenario in (1, 2, 4)]
+
+
+# every member ends where its own single run ends, also when the members are stepped in chunks
+@pytest.mark.parametrize("max_block_elements", [forces.max_block_elements, 250])
+def test_ensemble_matches_single_runs(monkeypatch, max_block_elements):
+    monkeypatch.setattr(forces, "max_block_elements", max_block_elements)
+    configs = get_configs()
+    results = ensemble.run_ensemble(configs)
+    assert sum(result["final_reaction_count"] for result in results) > 0
+    for config, result in zip(configs, results):
+        expected = simulation.run(config)
+        assert result["steps"] == expected["steps"]
+        for name in ("reaction_count", "time", "sub_energy"):
+            assert result["final_" + name] == pytest.approx(expected["final_" + name], rel=1e-9)
+        np.testing.assert_array_equal(result["species"], expected["species"])
+        np.testing.assert_allclose(result["velocity"], expected["velocity"], rtol=1e-9)
+        np.testing.assert_allclose(result["position"], expected["position"], rtol=1e-9)
+        assert result["final_temperature"] == pytest.approx(expected["final_temperature"], rel=1e-9)
+
+
+def test_max_steps_zero_makes_no_step():
+    result = ensemble.run_ensemble([simulation.make_config({"seed": 0, "max_steps": 0})])[0]
+    expected = simulation.run(simulation.make_config({"seed": 0, "max_steps": 0}))
+    assert result["steps"] == expected["steps"] == 0
+    np.testing.assert_array_equal(result["position"], expected["position"])
+
+
+@pytest.mark.parametrize("overrides", [{"backend": "python"}, {"force_solver": "barnes-hut"},
+                                       {"observable_intervals": {"thermodynamics": 5}}, {"energy_diagnostic": True},
+                                       {"timestep": "block"}, {"integrator": "leapfrog"}])
+def test_unsupported_options_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        ensemble.run_ensemble([simulation.make_config({"seed": 0}, overrides)])
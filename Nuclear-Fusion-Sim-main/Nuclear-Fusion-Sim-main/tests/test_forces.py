@@ -0,0 +1,49 @@
+import numpy as np
+
+from backends import PythonDirectForce
+from forces import BarnesHutForce, DirectForce, compare_forces
+from Particles.store import species_charge, species_mass
+
+
+def get_particles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    species = rng.integers(0, 4, n)
+    return rng.uniform(0, 1e-2, (n, 3)), species_charge[species], species_mass[species]
+
+
+# the one-pass numpy force against the reference pair loop, for all particles, a subset of
+# targets and blocks smaller than the particle count
+def test_direct_force_matches_pair_loop():
+    position, charge, mass = get_particles(40)
+    expected = PythonDirectForce().get_accelerations(position, charge, mass)
+    np.testing.assert_allclose(DirectForce().get_accelerations(position, charge, mass), expected, rtol=1e-12)
+    np.testing.assert_allclose(DirectForce(block_size=7).get_accelerations(position, charge, mass), expected,
+                               rtol=1e-12)
+    targets = np.array([3, 0, 17, 39])
+    np.testing.assert_allclose(DirectForce().get_accelerations(position, charge, mass, targets=targets),
+                               expected[targets], rtol=1e-12)
+
+
+def test_coincident_particles_exert_no_force():
+    position, charge, mass = get_particles(3)
+    position[1] = position[0]
+    acc = DirectForce().get_accelerations(position, charge, mass)
+    assert np.all(np.isfinite(acc))
+    np.testing.assert_allclose(acc, PythonDirectForce().get_accelerations(position, charge, mass), rtol=1e-12)
+
+
+# the tree force converges on the exact sum as the opening angle shrinks, also for a subset of targets
+def test_barnes_hut_error_shrinks_with_theta():
+    position, charge, mass = get_particles(1000)
+    errors = [compare_forces(position, charge, mass, BarnesHutForce(theta))["rms_error"]
+              for theta in (1.0, 0.7, 0.5, 0.3)]
+    assert all(coarse > fine for coarse, fine in zip(errors, errors[1:]))
+    result = compare_forces(position, charge, mass, BarnesHutForce(0.3))
+    assert result["rms_error"] < 5e-3 and result["max_error"] < 0.1
+
+    targets = np.flatnonzero(charge)[[5, 0, -1, 42]]  # neutrons feel no force
+    acc = BarnesHutForce(0.3).get_accelerations(position, charge, mass, targets=targets)
+    np.testing.assert_allclose(acc, BarnesHutForce(0.3).get_accelerations(position, charge, mass)[targets],
+                               rtol=1e-12)
+    exact = DirectForce().get_accelerations(position, charge, mass, targets=targets)
+    assert np.all(np.linalg.norm(acc - exact, axis=1) < 0.1 * np.linalg.norm(exact, axis=1))
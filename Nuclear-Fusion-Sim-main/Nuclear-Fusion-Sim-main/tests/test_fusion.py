@@ -0,0 +1,32 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import simulation
+from Particles.store import ParticleStore, DEUTERON, TRITON, HELION, NEUTRON
+
+# one deuteron with two tritons inside its fusion distance (5e-4 m in scenario 1) and one far away
+particles = ((DEUTERON, (5e-3, 5e-3, 5e-3)), (TRITON, (5.3e-3, 5e-3, 5e-3)), (TRITON, (5e-3, 5.2e-3, 5e-3)),
+             (TRITON, (1e-3, 1e-3, 1e-3)))
+closest = 2
+
+
+def get_chamber(order, backend):
+    chamber = simulation.build_chamber(simulation.make_config({"particle_pairs": 0, "seed": 0, "backend": backend}))
+    chamber.store = ParticleStore()
+    chamber.store.add_many([particles[i][0] for i in order], [particles[i][1] for i in order], np.ones((4, 3)))
+    return chamber
+
+
+# the deuteron fuses once, with its closest triton, whatever the particle order and search path
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("order", list(itertools.permutations(range(4))))
+def test_deuteron_fuses_once_with_closest_triton(backend, order):
+    expected = np.array([NEUTRON, TRITON, HELION, TRITON])[list(order)]
+    for targets in (None, np.array([order.index(0)])):
+        chamber = get_chamber(order, backend)
+        d, t = chamber.get_fusion_pairs(targets)
+        assert (d.tolist(), t.tolist()) == ([order.index(0)], [order.index(closest)])
+        assert chamber.fuse(targets) == 1
+        np.testing.assert_array_equal(chamber.store.species, expected)
@@ -0,0 +1,28 @@
+import pytest
+
+import forces
+import simulation
+from Particles.store import DEUTERON
+
+
+# relative energy drift after a close fly-by of two deuterons at a fixed step, with a force constant
+# that makes the potential energy about 40% of the kinetic energy (they do not fuse, nor reach a wall)
+def get_energy_drift(integrator, steps=40):
+    chamber = simulation.build_chamber(simulation.make_config({"particle_pairs": 0, "integrator": integrator}))
+    chamber.set_dt = lambda max_v: None
+    chamber.dt = 1e-9
+    chamber.store.add(DEUTERON, 4e-3, 5e-3, 5e-3, 1e5)
+    chamber.store.add(DEUTERON, 6e-3, 5.3e-3, 5e-3, -1e5)
+    chamber.get_energy_drift()
+    for _ in range(steps):
+        chamber.update_particles()
+    assert chamber.sub_energy == 0
+    return abs(chamber.get_energy_drift())
+
+
+@pytest.mark.parametrize("integrator", ["leapfrog", "velocity-verlet"])
+def test_second_order_integrators_drift_less_than_euler(monkeypatch, integrator):
+    monkeypatch.setattr(forces, "force_constant", 1e18)
+    euler = get_energy_drift("euler")
+    assert euler > 1e-3  # the forces matter
+    assert get_energy_drift(integrator) < euler / 10
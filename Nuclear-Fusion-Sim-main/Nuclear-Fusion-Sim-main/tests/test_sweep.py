@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+import simulation
+import sweep
+
+
+def get_configs():
+    return sweep.expand_grid(simulation.make_config({"max_steps": 5}), {"seed": list(range(8))})
+
+
+# a task that fails in its worker gets no row, the rows of every other task are still written
+def test_failed_task_keeps_other_rows(tmp_path):
+    configs = get_configs()
+    table, out_dir = str(tmp_path / "sweep.csv"), tmp_path / "results"
+    failing = sweep.get_task_key(configs[3])
+    os.makedirs(out_dir / (failing + ".npz"))  # its result file cannot be written
+    skipped, ran, failed = sweep.run_sweep(configs, table, workers=2, out_dir=str(out_dir))
+    assert (skipped, ran) == (0, 7)
+    assert [task for task, error in failed] == [failing]
+    assert {row["task"] for row in sweep.read_table(table)} == {sweep.get_task_key(config) for config in configs} \
+        - {failing}
+
+    os.rmdir(out_dir / (failing + ".npz"))
+    assert sweep.run_sweep(configs, table, workers=2, out_dir=str(out_dir)) == (7, 1, [])
+
+
+# bad config values stop the sweep before any task runs
+def test_invalid_config_is_rejected_before_running(tmp_path):
+    configs = get_configs()
+    configs[5]["integrator"] = "bogus"
+    table = str(tmp_path / "sweep.csv")
+    with pytest.raises(ValueError, match=sweep.get_task_key(configs[5])):
+        sweep.run_sweep(configs, table, workers=2)
+    assert not os.path.exists(table)
@@ -0,0 +1,27 @@
+import numpy as np
+
+import simulation
+from Particles.store import NEUTRON
+
+
+# scenario 1 gas with a fast neutron in the middle, as after ignition; the neutron feels no force,
+# so the step it sets is the same before and after the kick
+def get_chamber(timestep):
+    chamber = simulation.build_chamber(simulation.make_config({"particle_pairs": 20, "seed": 3, "timestep": timestep}))
+    chamber.store.add(NEUTRON, chamber.x / 2, chamber.y / 2, chamber.z / 2, 1e7)
+    chamber.set_dt(1e7)
+    return chamber
+
+
+# with a single level every particle is kicked and drifted by the global step
+def test_block_step_with_one_level_is_global_euler_step():
+    expected = get_chamber("global")
+    expected.update_particles()
+    chamber = get_chamber("block")
+    chamber.max_level = 0
+    chamber.update_particles()
+    assert chamber.dt == expected.dt and chamber.Time == expected.Time
+    np.testing.assert_array_equal(chamber.store.species, expected.store.species)
+    np.testing.assert_allclose(chamber.store.velocity, expected.store.velocity, rtol=1e-12)
+    np.testing.assert_allclose(chamber.store.position, expected.store.position, rtol=1e-12)
+    assert chamber.Temperature == expected.Temperature